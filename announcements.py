@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+
+"""
+announcements.py -- Udacity conference server-side Python App Engine
+    announcement of the nearly sold out conferences
+
+$Id$
+
+created on 2026 oct 17
+
+The conferences with 1 to NEARLY_SOLD_OUT_SEATS seats left are kept in a
+single Announcement entity, updated whenever the seats or the name of a
+conference change. memcache holds the announcement text and is read
+through, so the announcement survives an eviction without any query.
+
+"""
+
+from google.appengine.api import memcache
+from google.appengine.ext import ndb
+
+from models import Announcement
+from models import Conference
+
+MEMCACHE_ANNOUNCEMENTS_KEY = "RECENT_ANNOUNCEMENTS"
+NEARLY_SOLD_OUT_SEATS = 5
+ANNOUNCEMENT_ID = 'nearlySoldOut'
+
+
+def _announcementKey():
+    return ndb.Key(Announcement, ANNOUNCEMENT_ID)
+
+
+def nearlySoldOut(conference):
+    """ Return True if conference has to be announced."""
+    return 0 < (conference.seatsAvailable or 0) <= NEARLY_SOLD_OUT_SEATS
+
+
+def _format(announcement):
+    """ Return the announcement text, empty if no conference is nearly sold out."""
+
+    if not announcement or not announcement.conferenceNames:
+        return ""
+    return '%s %s' % (
+        'Last chance to attend! The following conferences are nearly sold out:',
+        ', '.join(announcement.conferenceNames)
+    )
+
+
+def getAnnouncement():
+    """ Return the announcement text from memcache, or from datastore on a miss."""
+
+    text = memcache.get(MEMCACHE_ANNOUNCEMENTS_KEY)
+    if text is None:
+        text = _format(_announcementKey().get())
+        memcache.add(MEMCACHE_ANNOUNCEMENTS_KEY, text)
+    return text
+
+
+def _cacheOnCommit(announcement):
+    # set once the entity is committed, replacing a text cached meanwhile
+    # by a reader of the previous version
+    text = _format(announcement)
+    ndb.get_context().call_on_commit(
+        lambda: memcache.set(MEMCACHE_ANNOUNCEMENTS_KEY, text))
+
+
+def conferenceChanged(conference):
+    """ Add conference to the announcement, remove it or update its name after
+        its seats or name changed. Joins the transaction of the caller if
+        there is one."""
+    conferencesChanged([conference])
+
+
+def conferencesChanged(conferences):
+    """ conferenceChanged for many conferences, with a single write of the
+        announcement."""
+
+    @ndb.transactional(xg=True)
+    def _update():
+        key = _announcementKey()
+        announcement = key.get() or Announcement(key=key)
+        entries = zip(announcement.conferenceKeys, announcement.conferenceNames)
+
+        updated = entries
+        for conference in conferences:
+            confKeys = [confKey for confKey, name in updated]
+            if not nearlySoldOut(conference):
+                updated = [(confKey, name) for confKey, name in updated
+                           if confKey != conference.key]
+            elif conference.key in confKeys:
+                updated = [(confKey, conference.name if confKey == conference.key else name)
+                           for confKey, name in updated]
+            else:
+                updated = updated + [(conference.key, conference.name)]
+
+        if updated != entries:
+            announcement.conferenceKeys = [confKey for confKey, name in updated]
+            announcement.conferenceNames = [name for confKey, name in updated]
+            announcement.put()
+            _cacheOnCommit(announcement)
+
+    _update()
+
+
+def rebuildAnnouncement():
+    """ Rebuild the announcement from a query on the conferences, to repair
+        it if an update was lost; return the announcement text."""
+
+    conferences = Conference.query(
+        ndb.AND(
+            Conference.seatsAvailable <= NEARLY_SOLD_OUT_SEATS,
+            Conference.seatsAvailable > 0
+        )
+    ).fetch(projection=[Conference.name])
+
+    @ndb.transactional
+    def _rebuild():
+        announcement = Announcement(
+            key=_announcementKey(),
+            conferenceKeys=[conf.key for conf in conferences],
+            conferenceNames=[conf.name for conf in conferences]
+        )
+        announcement.put()
+        _cacheOnCommit(announcement)
+        return _format(announcement)
+
+    return _rebuild()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+
+"""
+benchmark.py -- Udacity conference server-side Python App Engine
+    datastore RPCs and latency of the create and update endpoints
+
+$Id$
+
+created on 2026 oct 17
+
+Runs the API against the local App Engine service stubs and prints, for
+each write endpoint, the number of datastore RPCs of one call (counted by
+a hook of the API proxy) and its wall time. Run it with the path of
+the App Engine Python SDK, and optionally the directory of another checkout
+of the app to measure it instead of this one, e.g. the commit before a
+change to compare the RPC counts before and after it:
+
+    python benchmark.py /path/to/google_appengine [number of calls] [app directory]
+
+"""
+
+import os
+import sys
+import time
+
+ORGANIZER_EMAIL = 'organizer@example.com'
+
+
+def setUpStubs(sdkPath, appDir):
+    """ Activate the service stubs. It must be done before the app modules
+        are imported, since they may hook the current API proxy."""
+
+    sys.path.insert(0, sdkPath)
+    import dev_appserver
+    dev_appserver.fix_sys_path()
+
+    from google.appengine.datastore import datastore_stub_util
+    from google.appengine.ext import testbed
+
+    bed = testbed.Testbed()
+    bed.activate()
+    bed.init_datastore_v3_stub(
+        consistency_policy=datastore_stub_util.PseudoRandomHRConsistencyPolicy(probability=1))
+    bed.init_memcache_stub()
+    bed.init_taskqueue_stub(root_path=appDir)
+    bed.init_app_identity_stub()
+    bed.init_mail_stub()
+    bed.init_urlfetch_stub()
+    bed.init_user_stub()
+
+    # the user seen by endpoints.get_current_user()
+    os.environ['ENDPOINTS_AUTH_EMAIL'] = ORGANIZER_EMAIL
+    os.environ['ENDPOINTS_AUTH_DOMAIN'] = 'example.com'
+
+    # the app modules are imported from appDir
+    sys.path.insert(0, appDir)
+    return bed
+
+
+# datastore RPCs issued since the last reset, counted here rather than by
+# utils.RequestContext so that checkouts without it can be measured too
+_rpcCount = [0]
+
+
+def _countDatastoreRpc(service, call, request, response):
+    _rpcCount[0] += 1
+
+
+def measure(name, call, requests):
+    """ Run call once per simulated request and print its average number of
+        datastore RPCs and time."""
+
+    from google.appengine.ext import ndb
+
+    rpcs = 0
+    start = time.time()
+    for index in range(requests):
+        # a new request log id starts a new request context
+        os.environ['REQUEST_LOG_ID'] = '%s-%d' % (name, index)
+        ndb.get_context().clear_cache()
+        _rpcCount[0] = 0
+        call()
+        rpcs += _rpcCount[0]
+    elapsed = time.time() - start
+
+    print '%-36s %8.1f %10.2f' % (name, float(rpcs) / requests, 1000 * elapsed / requests)
+
+
+def main(sdkPath, requests=20, appDir=os.path.dirname(os.path.abspath(__file__))):
+    setUpStubs(sdkPath, os.path.abspath(appDir))
+
+    from google.appengine.api import apiproxy_stub_map
+    apiproxy_stub_map.apiproxy.GetPreCallHooks().Append(
+        'benchmark_rpc_count', _countDatastoreRpc, 'datastore_v3')
+
+    from google.appengine.ext import ndb
+    import conference
+    from models import Conference
+    from models import ConferenceForm, ConferenceForms
+    from models import Profile
+    from models import ProfileMiniForm
+    from models import SessionForm
+    from models import Speaker
+    from models import SpeakerForm, SpeakerForms
+
+    api = conference.ConferenceApi()
+
+    # the fixtures are written directly, so a checkout with a broken create
+    # endpoint can still be measured
+    profileKey = Profile(key=ndb.Key(Profile, ORGANIZER_EMAIL), displayName='Organizer',
+                         mainEmail=ORGANIZER_EMAIL, teeShirtSize='NOT_SPECIFIED').put()
+    speakerKey = Speaker(name='Speaker').put().urlsafe()
+    conferenceKey = Conference(parent=profileKey, name='Conference', maxAttendees=100,
+                               seatsAvailable=100, organizerUserId=ORGANIZER_EMAIL,
+                               organizerDisplayName='Organizer').put().urlsafe()
+
+    def session(index=0):
+        return SessionForm(name='Session %d' % index, speakerKey=speakerKey,
+                           date='2015-06-0%d' % (index % 9 + 1),
+                           startTime='10:00:00', endTime='11:00:00')
+
+    def sessionRequest():
+        # websafeKey of the path is the conference, the one of the form is unset
+        fields = dict((field.name, getattr(session(), field.name))
+                      for field in SessionForm.all_fields() if field.name != 'websafeKey')
+        return conference.SESS_POST_REQUEST_BY_CONFERENCE_WEBSAFEKEY.combined_message_class(
+            websafeKey=conferenceKey, **fields)
+
+    endpoints = [
+        ('saveProfile', 'saveProfile', lambda: ProfileMiniForm(
+            displayName='Organizer', teeShirtSize=None)),
+        ('createSpeaker', 'createSpeaker', lambda: SpeakerForm(name='Speaker')),
+        ('createSpeakers (10 speakers)', 'createSpeakers', lambda: SpeakerForms(
+            items=[SpeakerForm(name='Speaker %d' % i) for i in range(10)])),
+        ('createConference', 'createConference', lambda: ConferenceForm(
+            name='Conference', maxAttendees=100)),
+        ('createConferences (10 conferences)', 'createConferences', lambda: ConferenceForms(
+            items=[ConferenceForm(name='Conference %d' % i, maxAttendees=100)
+                   for i in range(10)])),
+        ('updateConference', 'updateConference',
+         lambda: conference.CONF_PUT_REQUEST.combined_message_class(
+             websafeKey=conferenceKey, city='London')),
+        ('createSession', 'createSession', sessionRequest),
+        ('createSessions (10 sessions)', 'createSessions',
+         lambda: conference.SESSIONS_POST_REQUEST_BY_CONFERENCE_WEBSAFEKEY.combined_message_class(
+             websafeKey=conferenceKey, items=[session(i) for i in range(10)])),
+    ]
+
+    print '%-36s %8s %10s' % ('endpoint', 'RPCs', 'ms')
+    for name, method, makeRequest in endpoints:
+        # an older checkout may not have all the endpoints
+        if not hasattr(api, method):
+            print '%-36s %8s %10s' % (name, '-', '-')
+            continue
+        try:
+            measure(name, lambda: getattr(api, method)(makeRequest()), requests)
+        except Exception as e:
+            print '%-36s failed: %r' % (name, e)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        sys.exit(__doc__)
+    main(sys.argv[1], *[int(arg) for arg in sys.argv[2:3]] + sys.argv[3:4])
@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+
+"""
+cache.py -- Udacity conference server-side Python App Engine
+    read-through memcache layer for Conference, Session and Speaker entities
+
+$Id$
+
+created on 2026 oct 17
+
+"""
+
+import cPickle
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from google.appengine.api import memcache
+from google.appengine.ext import ndb
+from protorpc import protobuf
+
+from settings import QUERY_CACHE_TIME
+
+# Bump the version to drop every cached entity at once, e.g. when a model
+# changes in a way that old pickled entities should not be served anymore.
+ENTITY_CACHE_VERSION = 2
+ENTITY_CACHE_TIME = 600  # seconds
+# After an invalidation the key can't be added back for this long, so a
+# reader which fetched the entity before the write can't cache the old value.
+ENTITY_LOCK_TIME = 30  # seconds
+
+# The instance tier can't be invalidated by writes made on other instances,
+# so its entries are only kept for a short time.
+LOCAL_CACHE_SIZE = 1000
+LOCAL_CACHE_TIME = 10  # seconds
+
+MEMCACHE_QUERY_GENERATION_KEY = "QUERY_GENERATION:%s"
+
+# memcache key -> (pickled entity, expiry time), least recently used first
+_localCache = OrderedDict()
+_localCacheLock = threading.Lock()
+
+
+def _entityCacheKey(key):
+    """ Return the versioned memcache key of an entity key."""
+    return 'ENTITY:%s:%s' % (ENTITY_CACHE_VERSION, key.urlsafe())
+
+
+def _getLocal(cacheKey):
+    """ Return a copy of the entity cached in this instance, or None."""
+
+    with _localCacheLock:
+        entry = _localCache.pop(cacheKey, None)
+        if entry is None or entry[1] <= time.time():
+            return None
+        _localCache[cacheKey] = entry  # now the most recently used
+    # every caller gets its own copy, entities are not shared between requests
+    return cPickle.loads(entry[0])
+
+
+def _setLocal(cacheKey, entity):
+    """ Cache entity in this instance, dropping the least recently used."""
+
+    entry = (cPickle.dumps(entity, cPickle.HIGHEST_PROTOCOL),
+             time.time() + LOCAL_CACHE_TIME)
+    with _localCacheLock:
+        _localCache.pop(cacheKey, None)
+        _localCache[cacheKey] = entry
+        while len(_localCache) > LOCAL_CACHE_SIZE:
+            _localCache.popitem(last=False)
+
+
+def getEntity(key):
+    """ Return the entity of key from the cache, reading it from datastore
+        and caching it on a miss."""
+    return getEntityAsync(key).get_result()
+
+
+@ndb.tasklet
+def getEntityAsync(key):
+    """ Tasklet version of getEntity."""
+
+    entities = yield getEntitiesAsync([key])
+    raise ndb.Return(entities[0])
+
+
+@ndb.tasklet
+def getEntitiesAsync(keys):
+    """ Return the entities of keys (None for a missing one), looked up in
+        this instance, then in memcache with one batch, and only the misses
+        with one get_multi. Inside a transaction the datastore is always read
+        so the transaction sees consistent data. The misses are cached with
+        add, which fails while invalidate holds the key locked."""
+
+    if ndb.in_transaction():
+        entities = yield ndb.get_multi_async(keys)
+        raise ndb.Return(entities)
+
+    ctx = ndb.get_context()
+    cacheKeys = [_entityCacheKey(key) for key in keys]
+    entities = [_getLocal(cacheKey) for cacheKey in cacheKeys]
+
+    # the memcache gets of one batch are sent as a single RPC
+    misses = [i for i, entity in enumerate(entities) if entity is None]
+    if misses:
+        cached = yield [ctx.memcache_get(cacheKeys[i]) for i in misses]
+        for i, entity in zip(misses, cached):
+            if entity is not None:
+                entities[i] = entity
+                _setLocal(cacheKeys[i], entity)
+
+    misses = [i for i, entity in enumerate(entities) if entity is None]
+    if misses:
+        fetched = yield ndb.get_multi_async([keys[i] for i in misses])
+        puts = []
+        for i, entity in zip(misses, fetched):
+            if entity is not None:
+                entities[i] = entity
+                _setLocal(cacheKeys[i], entity)
+                puts.append(ctx.memcache_add(cacheKeys[i], entity, time=ENTITY_CACHE_TIME))
+        if puts:
+            yield puts
+
+    raise ndb.Return(entities)
+
+
+@ndb.tasklet
+def queryEntitiesAsync(q):
+    """ Run q as a keys-only query and hydrate the entities from the cache,
+        so the results stay as consistent as q while the entities themselves
+        are mostly served without datastore reads."""
+
+    keys = yield q.fetch_async(keys_only=True)
+    entities = yield getEntitiesAsync(keys)
+    raise ndb.Return([entity for entity in entities if entity is not None])
+
+
+def invalidate(*keys):
+    """ Remove the entities of keys from memcache and from this instance, and
+        the cached query results of their kinds. Inside a transaction this
+        happens on commit. The memcache keys stay locked for ENTITY_LOCK_TIME,
+        so a reader which fetched the old entity can't cache it afterwards."""
+
+    cacheKeys = [_entityCacheKey(key) for key in keys]
+    kinds = set(key.kind() for key in keys)
+
+    def _invalidate():
+        memcache.delete_multi(cacheKeys, seconds=ENTITY_LOCK_TIME)
+        with _localCacheLock:
+            for cacheKey in cacheKeys:
+                _localCache.pop(cacheKey, None)
+        for kind in kinds:
+            _invalidateQueries(kind)
+
+    ndb.get_context().call_on_commit(_invalidate)
+
+
+def queryResultKey(kind, filters, *options):
+    """ Return the memcache key of the result of a query on kind, given by
+        its parsed filters (dicts of field, operator and value) and any other
+        options shaping the result, the same whatever the order of the
+        filters. The key holds the current generation of kind, so it must be
+        computed once before the query runs and used for both getQueryResult
+        and setQueryResult: a result computed before a write is then stored
+        under the old generation, where nobody reads it. None when the query
+        result cache is disabled."""
+
+    if not QUERY_CACHE_TIME:
+        return None
+    normalized = sorted(
+        (filtr["field"], filtr["operator"], repr(filtr["value"])) for filtr in filters)
+    return _queryCacheKey(kind, hashlib.sha1(repr((normalized, options))).hexdigest())
+
+
+def getQueryResult(cacheKey, messageType):
+    """ Return the cached messageType result of a query, or None."""
+
+    if not cacheKey:
+        return None
+    encoded = memcache.get(cacheKey)
+    if encoded is None:
+        return None
+    return protobuf.decode_message(messageType, encoded)
+
+
+def setQueryResult(cacheKey, message):
+    """ Cache the result message of a query for QUERY_CACHE_TIME."""
+
+    if cacheKey:
+        memcache.set(cacheKey, protobuf.encode_message(message), time=QUERY_CACHE_TIME)
+
+
+def invalidateQueries(kind):
+    """ Drop the cached query results of kind, e.g. after creating an entity.
+        Inside a transaction this happens on commit."""
+    ndb.get_context().call_on_commit(lambda: _invalidateQueries(kind))
+
+
+def _invalidateQueries(kind):
+    # a new generation makes every cached result of kind unreachable
+    memcache.incr(MEMCACHE_QUERY_GENERATION_KEY % kind, initial_value=int(time.time()))
+
+
+def _queryCacheKey(kind, resultKey):
+    """ Return the memcache key of a query result in the current generation
+        of kind. The generation starts from the clock, so it doesn't go back
+        to a value of old results if memcache evicts it."""
+
+    generationKey = MEMCACHE_QUERY_GENERATION_KEY % kind
+    generation = memcache.get(generationKey)
+    if generation is None:
+        memcache.add(generationKey, int(time.time()))
+        generation = memcache.get(generationKey)
+    return 'QUERY:%s:%s:%s' % (kind, generation, resultKey)
@@ -8,7 +8,11 @@ created by wesc on 2014 apr 21
 """
 __author__ = 'wesc+api@google.com (Wesley Chun)'
 
-from datetime import datetime, timedelta
+import calendar
+import logging
+import operator
+import time
+from datetime import date, datetime, timedelta
 from sets import Set
 
 import endpoints
@@ -18,8 +22,10 @@ from protorpc import message_types
 from protorpc import remote
 
 from google.appengine.ext import ndb
+from google.appengine.api import datastore_errors
 from google.appengine.api import memcache
 from google.appengine.api import taskqueue
+from google.appengine.datastore.datastore_query import Cursor
 
 from models import Profile
 from models import ProfileMiniForm
@@ -27,6 +33,7 @@ from models import ProfileForm
 from models import TeeShirtSize
 
 from models import Conference
+from models import FeaturedSpeaker
 from models import ConferenceForm
 from models import ConferenceForms
 from models import QueryForm
@@ -41,6 +48,8 @@ from models import IntervalForm
 from models import IntervalForms
 
 from models import Speaker
+from models import SpeakerCalendar
+from models import SpeakerSessions
 from models import SpeakerForm
 from models import SpeakerForms
 
@@ -48,15 +57,38 @@ from models import BooleanMessage
 from models import ConflictException
 from models import StringMessage
 
-from utils import getUserId, currentUser, duration
+from utils import currentUser, currentUserId, currentProfileAsync
+from utils import duration, logRpcCount, requestContext, startRequest
+
+import announcements
+import cache
+import mailer
+import seats
 
 from settings import WEB_CLIENT_ID
+from settings import SESSION_SEATS_FLAG
+from settings import SESSION_TIME_BUCKET_FILTERS
 
 EMAIL_SCOPE = endpoints.EMAIL_SCOPE
 API_EXPLORER_CLIENT_ID = endpoints.API_EXPLORER_CLIENT_ID
 
-MEMCACHE_ANNOUNCEMENTS_KEY = "RECENT_ANNOUNCEMENTS"
 MEMCACHE_FEATURED_SPEAKER_KEY = "FEATURED_SPEAKER"
+MEMCACHE_CONFERENCE_FEATURED_SPEAKER_KEY = "FEATURED_SPEAKER:%s"
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+BATCH_SIZE = 100  # entities written per batch by background tasks
+# a page of a query with Python post-filters scans at most this many pages
+MAX_SCAN_PAGES = 10
+# datastore limit on the queries an IN or "!=" filter is split into
+MAX_SUBQUERIES = 30
+# longest range of months answered by speakersAvailability
+MAX_AVAILABILITY_MONTHS = 24
+# most entities created by one call of a bulk endpoint
+MAX_BULK_CREATE = 500
+# seconds during which the new sessions of a speaker in a conference are
+# counted by a single featured speaker task
+FEATURED_SPEAKER_DELAY = 10
 
 GET_REQUEST_BY_CONFERENCE_WEBSAFEKEY = endpoints.ResourceContainer(
     message_types.VoidMessage,
@@ -68,6 +100,11 @@ SESS_POST_REQUEST_BY_CONFERENCE_WEBSAFEKEY = endpoints.ResourceContainer(
     websafeKey=messages.StringField(1),
 )
 
+SESSIONS_POST_REQUEST_BY_CONFERENCE_WEBSAFEKEY = endpoints.ResourceContainer(
+    SessionForms,
+    websafeKey=messages.StringField(1),
+)
+
 GET_REQUEST_BY_CONFERENCE_WEBSAFEKEY_AND_TYPE_OF_SESSION = endpoints.ResourceContainer(
     message_types.VoidMessage,
     websafeKey=messages.StringField(1),
@@ -77,6 +114,8 @@ GET_REQUEST_BY_CONFERENCE_WEBSAFEKEY_AND_TYPE_OF_SESSION = endpoints.ResourceCon
 GET_REQUEST_BY_SPEAKER = endpoints.ResourceContainer(
     message_types.VoidMessage,
     speaker=messages.StringField(1),
+    pageSize=messages.IntegerField(2),
+    pageToken=messages.StringField(3),
 )
 
 GET_REQUEST_BY_SESSION_WEBSAFEKEY = endpoints.ResourceContainer(
@@ -91,6 +130,21 @@ GET_REQUEST_FOR_SPARE_TIME_FOR_SPEAKER = endpoints.ResourceContainer(
     speakerKey=messages.StringField(3),
 )
 
+GET_REQUEST_FOR_SPEAKERS_AVAILABILITY = endpoints.ResourceContainer(
+    message_types.VoidMessage,
+    speakerKeys=messages.StringField(1, repeated=True),
+    fromMonth=messages.IntegerField(2),
+    fromYear=messages.IntegerField(3),
+    toMonth=messages.IntegerField(4),
+    toYear=messages.IntegerField(5),
+)
+
+GET_REQUEST_PAGE = endpoints.ResourceContainer(
+    message_types.VoidMessage,
+    pageSize=messages.IntegerField(1),
+    pageToken=messages.StringField(2),
+)
+
 CONF_PUT_REQUEST = endpoints.ResourceContainer(
     ConferenceForm,
     websafeKey=messages.StringField(1),
@@ -119,6 +173,18 @@ OPERATORS = {
     'NE': '!='
 }
 
+# Python equivalents of the operators, used by the post-filters
+OPERATOR_FUNCTIONS = {
+    '=': operator.eq,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+    '!=': operator.ne,
+}
+
+DATE_FIELDS = ["startDate", "endDate", "date"]
+
 CONFERENCE_FIELDS = {
     'NAME': 'name',
     'CITY': 'city',
@@ -131,6 +197,43 @@ CONFERENCE_FIELDS = {
     'END_DATE': 'endDate',
 }
 
+# Properties loaded by the projection queries of view SUMMARY, they must
+# match the projection indexes in index.yaml
+CONFERENCE_SUMMARY_FIELDS = (
+    'name',
+    'city',
+    'startDate',
+    'endDate',
+    'maxAttendees',
+    'seatsAvailable',
+    'organizerDisplayName',
+)
+
+SESSION_SUMMARY_FIELDS = (
+    'name',
+    'typeOfSession',
+    'date',
+    'startTime',
+    'endTime',
+)
+
+# Fields which may have an equality filter in a projection query of view
+# SUMMARY: index.yaml has a projection index without filters and one per
+# field listed here. Other filters fall back to full entities.
+CONFERENCE_SUMMARY_FILTERS = ('city',)
+SESSION_SUMMARY_FILTERS = ()
+
+VIEWS = ['FULL', 'SUMMARY']
+
+# Session properties needed by the computed fields of SessionForm
+SESSION_FORM_PROPERTIES = {
+    'speakerKey': ['speaker'],
+    'date': ['date'],
+    'startTime': ['startTime'],
+    'endTime': ['endTime'],
+    'duration': ['startTime', 'endTime'],
+}
+
 SESSION_FIELDS = {
     'NAME': 'name',
     'SPEAKER': 'speaker',
@@ -139,6 +242,14 @@ SESSION_FIELDS = {
     'START_TIME': 'startTime',
     'END_TIME': 'endTime',
     'LOCATION': 'location',
+    'START_HOUR': 'startHour',
+    'START_MINUTE': 'startMinute',
+    'DAY_OF_WEEK': 'dayOfWeek',
+}
+
+# Time properties of Session and the hour bucket that narrows their ranges
+TIME_BUCKETS = {
+    'startTime': 'startHour',
 }
 
 # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
@@ -150,6 +261,11 @@ SESSION_FIELDS = {
 class ConferenceApi(remote.Service):
     """ Conference API v0.1"""
 
+    def initialize_request_state(self, request_state):
+        """ Start a fresh request context for each API call."""
+        super(ConferenceApi, self).initialize_request_state(request_state)
+        startRequest()
+
 # - - - Profile objects - - - - - - - - - - - - - - - - - - - - - - - -
 
     def _copyProfileToForm(self, profile):
@@ -176,25 +292,28 @@ class ConferenceApi(remote.Service):
 
     def _getProfileFromUser(self):
         """ Return user Profile from datastore, creating new one if non-existent."""
+        return self._getProfileFromUserAsync().get_result()
+
+    @ndb.tasklet
+    def _getProfileFromUserAsync(self):
+        """ Tasklet version of _getProfileFromUser."""
 
-        user = endpoints.get_current_user()
-        if not user:
-            raise endpoints.UnauthorizedException('Authorization required')
+        user, userId = currentUserId()
 
-        # get profile from datastore
-        userId = getUserId(user)
-        profileKey = ndb.Key(Profile, userId)
-        profile = profileKey.get()
+        # get profile from datastore, at most once per request
+        profile = yield currentProfileAsync()
         # create new Profile if not there
         if not profile:
             profile = Profile(
-                key=profileKey,
+                key=ndb.Key(Profile, userId),
                 displayName=user.nickname(),
                 mainEmail=user.email(),
                 teeShirtSize=str(TeeShirtSize.NOT_SPECIFIED),
             )
-            profile.put()
-        return profile
+            yield profile.put_async()
+            if not ndb.in_transaction():
+                requestContext().profile = profile
+        raise ndb.Return(profile)
 
     def _doProfile(self, save_request=None):
         """ Get user profile and return to user, possibly updating it first."""
@@ -204,12 +323,25 @@ class ConferenceApi(remote.Service):
 
         # if save_request, process user-modifyable fields
         if save_request:
+            displayName = profile.displayName
+            changed = False
             for field in ('displayName', 'teeShirtSize'):
                 if hasattr(save_request, field):
                     val = getattr(save_request, field)
-                    if val:
+                    if val and getattr(profile, field) != str(val):
                         setattr(profile, field, str(val))
-                        profile.put()
+                        changed = True
+
+            # write the profile once, and only if it changed
+            if changed:
+                profile.put()
+
+            # copy the new name into the conferences organized by the user
+            if profile.displayName != displayName:
+                taskqueue.add(
+                    params={'profile_websafeKey': profile.key.urlsafe()},
+                    url='/tasks/update_organizer_display_name'
+                )
 
         # return ProfileForm
         return self._copyProfileToForm(profile)
@@ -234,20 +366,36 @@ class ConferenceApi(remote.Service):
 
     def _createSpeakerObject(self, request):
         """ Create or update Speaker object, returning SpeakerForm/request."""
+        return self._createSpeakerObjects([request])[0]
 
-        # copy SpeakerForm/ProtoRPC Message into dict
-        data = {field.name: getattr(request, field.name) for field in request.all_fields()}
-        del data['websafeKey']
+    def _createSpeakerObjects(self, requests):
+        """ Create Speaker objects given by SpeakerForms, with one id range
+            and one put_multi, returning their SpeakerForms."""
+
+        if not requests:
+            raise endpoints.BadRequestException("At least one speaker required")
+        if len(requests) > MAX_BULK_CREATE:
+            raise endpoints.BadRequestException(
+                "At most %s speakers can be created at once" % MAX_BULK_CREATE)
 
-        # allocate new Speaker ID
-        speakerId = Speaker.allocate_ids(size=1)[0]
-        # make Speaker key from ID
-        speakerKey = ndb.Key(Speaker, speakerId)
-        data['key'] = speakerKey
+        # allocate new Speaker IDs
+        firstId, lastId = Speaker.allocate_ids(size=len(requests))
 
-        # create Speaker
-        Speaker(**data).put()
-        return self._copySpeakerToForm(speakerKey.get())
+        speakers = []
+        for speakerId, request in zip(range(firstId, lastId + 1), requests):
+            # copy SpeakerForm/ProtoRPC Message into dict
+            data = {field.name: getattr(request, field.name) for field in request.all_fields()}
+            del data['websafeKey']
+
+            # make Speaker key from ID
+            data['key'] = ndb.Key(Speaker, speakerId)
+
+            # the speaker is validated when it is created
+            speakers.append(Speaker(**data))
+
+        # create Speakers
+        ndb.put_multi(speakers)
+        return [self._copySpeakerToForm(speaker) for speaker in speakers]
 
     def _copySpeakerToForm(self, speaker):
         """ Copy relevant fields from speaker to SpeakerForm."""
@@ -255,22 +403,11 @@ class ConferenceApi(remote.Service):
         speakerForm = SpeakerForm()
         for field in speakerForm.all_fields():
             if hasattr(speaker, field.name):
-                # Process the list of session keys in speaker
-                if field.name == "sessions":
-                    sessionKeys = getattr(speaker, field.name)
-
-                    sessions = ndb.get_multi(sessionKeys)
-                    session_websafeKeys = [
-                        session.key.urlsafe() for session in sessions]
-
-                    setattr(speakerForm, field.name, session_websafeKeys)
-
-                else:
-                    setattr(
-                        speakerForm,
-                        field.name,
-                        getattr(speaker, field.name)
-                    )
+                setattr(
+                    speakerForm,
+                    field.name,
+                    getattr(speaker, field.name)
+                )
 
             elif field.name == "websafeKey":
                 setattr(speakerForm, field.name, speaker.key.urlsafe())
@@ -286,50 +423,116 @@ class ConferenceApi(remote.Service):
         """ Create a new Speaker."""
         return self._createSpeakerObject(request)
 
-    @endpoints.method(message_types.VoidMessage, SpeakerForms,
+    @endpoints.method(SpeakerForms, SpeakerForms,
+                      path='speakers',
+                      http_method='POST',
+                      name='createSpeakers')
+    def createSpeakers(self, request):
+        """ Create many Speakers, none of them is created if one is invalid."""
+        return SpeakerForms(items=self._createSpeakerObjects(request.items))
+
+    @endpoints.method(GET_REQUEST_PAGE, SpeakerForms,
                       path='querySpeakers',
                       http_method='GET',
                       name='querySpeakers')
     def querySpeakers(self, request):
-        """Query for all speakers."""
+        """Query for all speakers, one page at a time."""
 
-        speakers = Speaker.query()
+        speakers, nextPageToken = self._fetchPage(Speaker.query(), request)
 
         # return individual SpeakerForm object per Speaker
         return SpeakerForms(
-            items=[self._copySpeakerToForm(speaker) for speaker in speakers]
+            items=[self._copySpeakerToForm(speaker) for speaker in speakers],
+            nextPageToken=nextPageToken
         )
 # - - - Conference objects - - - - - - - - - - - - - - - - - - - - - - -
 
     def _createConferenceObject(self, request):
         """Create a Conference object, returning ConferenceForm/request."""
+        return self._createConferenceObjects([request])[0]
 
-        if not request.name:
-            raise endpoints.BadRequestException("Conference 'name' field required")
+    def _createConferenceObjects(self, requests):
+        """ Create Conference objects given by ConferenceForms, returning their
+            ConferenceForms. All of them are checked first, then created with
+            one id range and one put_multi, and the organizer gets one email
+            for all of them."""
+
+        if not requests:
+            raise endpoints.BadRequestException("At least one conference required")
+        if len(requests) > MAX_BULK_CREATE:
+            raise endpoints.BadRequestException(
+                "At most %s conferences can be created at once" % MAX_BULK_CREATE)
 
         # preload necessary data items
         user, userId, userDisplayName, profileKey = currentUser()
 
+        conferencesData = [self._conferenceData(request) for request in requests]
+
+        # allocate new Conference IDs with profileKey as parent
+        firstId, lastId = Conference.allocate_ids(size=len(requests), parent=profileKey)
+
+        entities = []
+        conferences = []
+        for conferenceId, request, data in zip(range(firstId, lastId + 1), requests,
+                                               conferencesData):
+            # make Conference key from ID
+            conferenceKey = ndb.Key(Conference, conferenceId, parent=profileKey)
+            data['key'] = conferenceKey
+
+            data['organizerUserId'] = request.organizerUserId = userId
+            data['organizerDisplayName'] = request.organizerDisplayName = userDisplayName
+
+            conference = Conference(**data)
+            conferences.append(conference)
+            entities.append(conference)
+            entities += seats.createShards(conferenceKey, data['seatsAvailable'])
+
+        # create Conferences with their seat shards, send email to organizer
+        # confirming creation of Conferences & return (modified) ConferenceForms
+        ndb.put_multi(entities)
+        cache.invalidateQueries('Conference')
+
+        # a conference created with 1 to 5 seats is announced right away
+        announced = [conference for conference in conferences
+                     if announcements.nearlySoldOut(conference)]
+        if announced:
+            announcements.conferencesChanged(announced)
+
+        conferenceForms = [self._copyConferenceToForm(conference, userDisplayName)
+                           for conference in conferences]
+        mailer.queueConfirmation(user.email(), conferenceForms)
+        return conferenceForms
+
+    def _conferenceData(self, request):
+        """ Check a ConferenceForm and return the properties of its
+            Conference, except its key and organizer."""
+
+        if not request.name:
+            raise endpoints.BadRequestException("Conference 'name' field required")
+
         # copy ConferenceForm/ProtoRPC Message into dict
         data = {field.name: getattr(request, field.name) for field in request.all_fields()}
         del data['websafeKey']
-        del data['organizerDisplayName']
         del data['seatsAvailable']
 
         # add default values for those missing (both data model & outbound Message)
         for df in CONFERENCE_DEFAULTS:
-            if data[df] in (None, []):
+            if data.get(df) in (None, []):
                 data[df] = CONFERENCE_DEFAULTS[df]
                 setattr(request, df, CONFERENCE_DEFAULTS[df])
 
         # convert dates from strings to Date objects; set month based on start_date
-        if data['startDate']:
-            data['startDate'] = datetime.strptime(data['startDate'][:10], "%Y-%m-%d").date()
-            data['month'] = data['startDate'].month
-        else:
-            data['month'] = 0
-        if data['endDate']:
-            data['endDate'] = datetime.strptime(data['endDate'][:10], "%Y-%m-%d").date()
+        try:
+            if data['startDate']:
+                data['startDate'] = datetime.strptime(data['startDate'][:10], "%Y-%m-%d").date()
+                data['month'] = data['startDate'].month
+            else:
+                data['month'] = 0
+            if data['endDate']:
+                data['endDate'] = datetime.strptime(data['endDate'][:10], "%Y-%m-%d").date()
+        except ValueError:
+            raise endpoints.BadRequestException(
+                "Invalid date in conference '%s'" % request.name)
 
         # set seatsAvailable to be the same as maxAttendees on creation
         # both for data model & outbound Message
@@ -337,24 +540,7 @@ class ConferenceApi(remote.Service):
             data["seatsAvailable"] = data["maxAttendees"]
             setattr(request, "seatsAvailable", data["maxAttendees"])
 
-        # allocate new Conference ID with profileKey as parent
-        conferenceId = Conference.allocate_ids(size=1, parent=profileKey)[0]
-
-        # make Conference key from ID
-        conferenceKey = ndb.Key(Conference, conferenceId, parent=profileKey)
-        data['key'] = conferenceKey
-
-        data['organizerUserId'] = request.organizerUserId = userId
-
-        # create Conference, send email to organizer confirming
-        # creation of Conference & return (modified) ConferenceForm
-        Conference(**data).put()
-
-        taskqueue.add(
-            params={'email': user.email(), 'conferenceInfo': repr(request)},
-            url='/tasks/send_confirmation_email'
-        )
-        return self._copyConferenceToForm(conferenceKey.get(), userDisplayName)
+        return data
 
     @ndb.transactional(xg=True)
     def _updateConferenceObject(self, request):
@@ -383,13 +569,28 @@ class ConferenceApi(remote.Service):
                     if field.name == 'startDate':
                         conference.month = data.month
 
+                # seats are counted by the shards, so they only change with
+                # maxAttendees and the shards are updated in the same transaction
+                if field.name == 'seatsAvailable':
+                    continue
+                if field.name == 'maxAttendees' and conference.maxAttendees is not None:
+                    seats.addSeats(conference, data - conference.maxAttendees)
+
                 setattr(conference, field.name, data)
 
+        # the organizer name always comes from the organizer profile
+        conference.organizerDisplayName = userDisplayName
+
         conference.put()
+        cache.invalidate(conference.key)
+        if announcements.nearlySoldOut(conference):
+            # the name may have changed
+            announcements.conferenceChanged(conference)
         return self._copyConferenceToForm(conference, userDisplayName)
 
-    def _copyConferenceToForm(self, conference, displayName):
-        """ Copy relevant fields from Conference to ConferenceForm."""
+    def _copyConferenceToForm(self, conference, displayName=None):
+        """ Copy relevant fields from Conference to ConferenceForm, displayName
+            overrides the organizer name stored in the conference."""
 
         conferenceForm = ConferenceForm()
         for field in conferenceForm.all_fields():
@@ -426,6 +627,14 @@ class ConferenceApi(remote.Service):
         """ Create a new conference."""
         return self._createConferenceObject(request)
 
+    @endpoints.method(ConferenceForms, ConferenceForms,
+                      path='conferences',
+                      http_method='POST',
+                      name='createConferences')
+    def createConferences(self, request):
+        """ Create many conferences, none of them is created if one is invalid."""
+        return ConferenceForms(items=self._createConferenceObjects(request.items))
+
     @endpoints.method(CONF_PUT_REQUEST, ConferenceForm,
                       path='conference/{websafeKey}',
                       http_method='PUT', name='updateConference')
@@ -437,14 +646,25 @@ class ConferenceApi(remote.Service):
 
     def _createSessionObject(self, request):
         """ Create or update Session object, returning SessionForm/request."""
-
-        if not request.name:
-            raise endpoints.BadRequestException("Session 'name' field required")
+        return self._createSessionObjects(request.websafeKey, [request])[0]
+
+    def _createSessionObjects(self, websafeKey, requests):
+        """ Create the Sessions of a conference given by SessionForms, returning
+            their SessionForms. Everything is checked before anything is
+            written, then the ids are allocated in one range, the sessions are
+            written with one put_multi and one task updates the featured
+            speaker for all of them."""
+
+        if not requests:
+            raise endpoints.BadRequestException("At least one session required")
+        if len(requests) > MAX_BULK_CREATE:
+            raise endpoints.BadRequestException(
+                "At most %s sessions can be created at once" % MAX_BULK_CREATE)
 
         # preload necessary data items
         user, userId, userDisplayName, profileKey = currentUser()
 
-        conference, conferenceKey = self._getConferenceFromWebsafeKey(request.websafeKey)
+        conference, conferenceKey = self._getConferenceFromWebsafeKey(websafeKey)
 
         # Verify if the user is the organizer of the conference
         if profileKey != conference.key.parent():
@@ -452,6 +672,95 @@ class ConferenceApi(remote.Service):
                 "You must be the organizer of the conference to create its session."
             )
 
+        # check the speakers, each one once and all at the same time
+        speakerFutures = dict((websafeSpeakerKey, self._getSpeakerKeyAsync(websafeSpeakerKey))
+                              for websafeSpeakerKey in Set(req.speakerKey for req in requests))
+        sessionsData = [self._sessionData(req, conference) for req in requests]
+        speakerKeys = dict((websafeSpeakerKey, future.get_result()[1])
+                           for websafeSpeakerKey, future in speakerFutures.iteritems())
+
+        # allocate sessions' ids by setting conference key as a parent
+        firstId, lastId = Session.allocate_ids(size=len(requests), parent=conferenceKey)
+
+        sessions = []
+        busyDays = {}
+        for sessionId, req, data in zip(range(firstId, lastId + 1), requests, sessionsData):
+            data['key'] = ndb.Key(Session, sessionId, parent=conferenceKey)
+
+            # the one to many relationship between speaker and session is
+            # answered by a query on Session.speaker
+            data['speaker'] = speakerKeys[req.speakerKey]
+            sessions.append(Session(**data))
+
+            # the speaker is now busy on the day of the session
+            calendarKey = self._calendarKey(
+                data['speaker'], data['date'].year, data['date'].month)
+            busyDays[calendarKey] = busyDays.get(calendarKey, 0) | (1 << (data['date'].day - 1))
+
+        # create Session objects and put them into DB, all of them or none,
+        # the busy days are marked by a task enqueued only if they are written
+        def _put():
+            ndb.put_multi(sessions)
+            self._scheduleBusyDays(busyDays)
+        ndb.transaction(_put)
+        cache.invalidateQueries('Session')
+
+        # Add to a task queue the tasks to set memcache about featured
+        # speakers, without waiting while the forms are built
+        existingSpeakerKeys = Set(speakerKeys.values())
+        featuredSpeakerRpcs = self._scheduleFeaturedSpeakers(
+            conferenceKey, Set(session.speaker for session in sessions))
+
+        # return SessionForm objects, the speakers are known to exist
+        sessionForms = [self._copySessionToForm(session, existingSpeakerKeys)
+                        for session in sessions]
+
+        # the sessions are committed, a failed enqueue must not fail the call
+        for featuredSpeakerRpc in featuredSpeakerRpcs:
+            try:
+                featuredSpeakerRpc.get_result()
+            except (taskqueue.TaskAlreadyExistsError, taskqueue.TombstonedTaskError):
+                # a task for this speaker and window is already pending
+                pass
+            except taskqueue.Error:
+                logging.exception('Could not enqueue the featured speaker tasks of %s',
+                                  conferenceKey.urlsafe())
+        return sessionForms
+
+    @staticmethod
+    def _scheduleFeaturedSpeakers(conferenceKey, speakerKeys):
+        """ Enqueue the update of the featured speaker for the new sessions of
+            some speakers in a conference, return the RPCs of the enqueue, one
+            per batch of at most MAX_TASKS_PER_ADD tasks.
+            The task of a speaker is named after its window of
+            FEATURED_SPEAKER_DELAY seconds, so a burst of sessions for one
+            speaker leads to a single update. Named tasks can't be
+            transactional, they are enqueued once the sessions are written and
+            the task reads all the sessions of the speaker in the conference,
+            so a lost task is made up for by the next one."""
+
+        window = int(time.time() // FEATURED_SPEAKER_DELAY)
+        tasks = [taskqueue.Task(
+                    name='featured-%s-%s-%d' % (conferenceKey.urlsafe(), speakerKey.urlsafe(),
+                                                window),
+                    params={
+                        'speaker_websafeKey': speakerKey.urlsafe(),
+                        'conference_websafeKey': conferenceKey.urlsafe()
+                    },
+                    url='/tasks/setFeaturedSpeaker',
+                    countdown=FEATURED_SPEAKER_DELAY)
+                 for speakerKey in speakerKeys]
+        queue = taskqueue.Queue()
+        return [queue.add_async(tasks[start:start + taskqueue.MAX_TASKS_PER_ADD])
+                for start in range(0, len(tasks), taskqueue.MAX_TASKS_PER_ADD)]
+
+    def _sessionData(self, request, conference):
+        """ Check a SessionForm and return the properties of its Session,
+            except its key and speaker."""
+
+        if not request.name:
+            raise endpoints.BadRequestException("Session 'name' field required")
+
         # copy SessionForm/ProtoRPC Message into dict
         data = {field.name: getattr(request, field.name) for field in request.all_fields()}
 
@@ -465,57 +774,61 @@ class ConferenceApi(remote.Service):
                 setattr(request, df, SESSION_DEFAULTS[df])
 
         # convert dates from strings to Date and Time objects;
-        data['date'] = datetime.strptime(data['date'], "%Y-%m-%d")
-        data['startTime'] = datetime.strptime(data['startTime'], "%H:%M:%S")
-        data['endTime'] = datetime.strptime(data['endTime'], "%H:%M:%S")
+        try:
+            data['date'] = datetime.strptime(data['date'], "%Y-%m-%d")
+            data['startTime'] = datetime.strptime(data['startTime'], "%H:%M:%S")
+            data['endTime'] = datetime.strptime(data['endTime'], "%H:%M:%S")
+        except ValueError:
+            raise endpoints.BadRequestException(
+                "Invalid date or time in session '%s'" % request.name)
 
         if data['startTime'] > datetime.strptime("19:00:00", "%H:%M:%S"):
             data['lateSession'] = True
         else:
             data['lateSession'] = False
 
+        data.update(self._sessionTimeBuckets(data['date'], data['startTime'], data['endTime']))
+
+        if SESSION_SEATS_FLAG:
+            data['conferenceHasSeats'] = (conference.seatsAvailable or 0) > 0
+
         del data['speakerKey']
         del data['websafeKey']
         del data['duration']
+        return data
 
-        # allocate session's id by setting conference key as a parent
-        sessionId = Session.allocate_ids(size=1, parent=conferenceKey)[0]
-        sessionKey = ndb.Key(Session, sessionId, parent=conferenceKey)
-        data['key'] = sessionKey
-
-        # Update the one to many relationship between speaker and session
-        speaker, speakerKey = self._getSpeakerKey(request.speakerKey)
-        data['speaker'] = speaker.key
-
-        speaker.sessions.append(sessionKey)
-        speaker.put()
-
-        # create Session object and put it into DB
-        Session(**data).put()
-
-        # Add to a task queue the task to set memcache about featured speakers
-        taskqueue.add(
-            params={
-                'speaker_websafeKey': request.speakerKey,
-                'conference_websafeKey': request.websafeKey
-            },
-            url='/tasks/setFeaturedSpeaker'
-        )
+    @staticmethod
+    def _sessionTimeBuckets(sessionDate, startTime, endTime):
+        """ Return the time bucket properties of a session."""
 
-        # return SessionForm object
-        return self._copySessionToForm(sessionKey.get())
+        return {
+            'startMinute': startTime.hour * 60 + startTime.minute,
+            'endMinute': endTime.hour * 60 + endTime.minute,
+            'startHour': startTime.hour,
+            'dayOfWeek': sessionDate.weekday() if sessionDate else None,
+        }
 
-    def _copySessionToForm(self, session):
-        """ Copy relevant fields from Session to SessionForm."""
+    def _copySessionToForm(self, session, speakerKeys=None):
+        """ Copy relevant fields from Session to SessionForm.
+            speakerKeys is the set of existing speaker keys when it is already
+            known, otherwise the speaker of the session is checked by a get."""
 
         sessionForm = SessionForm()
 
         for field in sessionForm.all_fields():
 
+            # a projected session only has some of the properties
+            if not all(hasattr(session, name)
+                       for name in SESSION_FORM_PROPERTIES.get(field.name, [])):
+                continue
+
             if field.name == 'speakerKey':
-                speaker = session.speaker.get()
-                if speaker:
-                    setattr(sessionForm, 'speakerKey', speaker.key.urlsafe())
+                if speakerKeys is None:
+                    speakerExists = session.speaker.get() is not None
+                else:
+                    speakerExists = session.speaker in speakerKeys
+                if speakerExists:
+                    setattr(sessionForm, 'speakerKey', session.speaker.urlsafe())
 
             elif field.name == 'date':
                 setattr(sessionForm, 'date', str(session.date.date()))
@@ -542,6 +855,22 @@ class ConferenceApi(remote.Service):
         sessionForm.check_initialized()
         return sessionForm
 
+    def _copySessionsToForms(self, sessions):
+        """ Copy a list of Sessions to SessionForms, checking their speakers
+            with one get_multi instead of one get per session."""
+        return self._copySessionsToFormsAsync(sessions).get_result()
+
+    @ndb.tasklet
+    def _copySessionsToFormsAsync(self, sessions):
+        """ Tasklet version of _copySessionsToForms."""
+
+        sessions = list(sessions)
+        speakers = yield ndb.get_multi_async(
+            list(Set(sess.speaker for sess in sessions if hasattr(sess, 'speaker'))))
+        speakerKeys = Set(speaker.key for speaker in speakers if speaker)
+
+        raise ndb.Return([self._copySessionToForm(sess, speakerKeys) for sess in sessions])
+
     @endpoints.method(SESS_POST_REQUEST_BY_CONFERENCE_WEBSAFEKEY, SessionForm,
                       path='createSession/{websafeKey}',
                       http_method='POST',
@@ -552,14 +881,29 @@ class ConferenceApi(remote.Service):
 
         return self._createSessionObject(request)
 
+    @endpoints.method(SESSIONS_POST_REQUEST_BY_CONFERENCE_WEBSAFEKEY, SessionForms,
+                      path='createSessions/{websafeKey}',
+                      http_method='POST',
+                      name='createSessions')
+    def createSessions(self, request):
+        """ Create many Sessions in a conference given by a websafeKey, none
+            of them is created if one is invalid.
+            Open only to the organizer of that conference."""
+
+        return SessionForms(
+            items=self._createSessionObjects(request.websafeKey, request.items)
+        )
+
 # - - - User marks /unmarks session - - - - - - - - - - - - - - - - - -
 
     def _addSessionToWishlist(self, request, mark=True):
         retval = None
 
-        profile = self._getProfileFromUser()  # get user Profile
-
-        session, sessionKey = self._getSessionFromWebsafeKey(request.websafeKey)
+        # get user Profile and check the session concurrently
+        profileFuture = self._getProfileFromUserAsync()
+        sessionFuture = self._getSessionFromWebsafeKeyAsync(request.websafeKey)
+        profile = profileFuture.get_result()
+        session, sessionKey = sessionFuture.get_result()
 
         # user wants to mark this session
         if mark:
@@ -611,7 +955,9 @@ class ConferenceApi(remote.Service):
 
         user, userId, userDisplayName, userProfileKey = currentUser()
 
-        conferences = Conference.query(ancestor=userProfileKey)
+        # keys-only ancestor query, then the conferences mostly come from the cache
+        conferences = cache.queryEntitiesAsync(
+            Conference.query(ancestor=userProfileKey)).get_result()
 
         # return set of ConferenceForm objects per Conference
         return ConferenceForms(
@@ -628,45 +974,35 @@ class ConferenceApi(remote.Service):
             SEATS_AVAILABLE, START_DATE, END_DATE,
             using these operators: EQ, GT, GTEQ, LT, LTEQ, NE."""
 
-        conferences = self._getConferenceQuery(request)
+        q, filters, postFilters, plan = self._getConferenceQuery(request)
+        projection = self._getProjection(
+            request, filters, postFilters,
+            CONFERENCE_SUMMARY_FIELDS, CONFERENCE_SUMMARY_FILTERS)
 
-        names = self._getOrganizerNames(conferences)
+        # identical filter sets are answered from memcache
+        resultKey = cache.queryResultKey(
+            'Conference', filters, *self._pageOptions(request, projection))
+        conferenceForms = cache.getQueryResult(resultKey, ConferenceForms)
+        if conferenceForms:
+            return conferenceForms
+
+        conferences, nextPageToken = self._fetchPage(q, request, projection, postFilters)
 
         # return individual ConferenceForm object per Conference
-        return ConferenceForms(
-            items=[
-                self._copyConferenceToForm(conf, names[conf.organizerUserId]) for conf in conferences
-            ]
+        conferenceForms = ConferenceForms(
+            items=self._copyEqualityFilters(
+                [self._copyConferenceToForm(conf) for conf in conferences],
+                filters, CONFERENCE_SUMMARY_FIELDS, projection),
+            nextPageToken=nextPageToken,
+            queryPlan=plan
         )
-
-    def _getOrganizerNames(self, conferences):
-
-        # need to fetch organiser displayName from profiles
-        # get all keys and use get_multi for speed
-        organisers = [(ndb.Key(Profile, conf.organizerUserId)) for conf in conferences]
-        profiles = ndb.get_multi(organisers)
-
-        names = {}
-        for profile in profiles:
-            names[profile.key.id()] = profile.displayName
-        return names
+        cache.setQueryResult(resultKey, conferenceForms)
+        return conferenceForms
 
     def _getConferenceQuery(self, request):
-        """ Return formatted query from the submitted filters."""
-
-        q = Conference.query()
-
-        # Check and format the filters
-        inequality_filter, filters = self._checkAndFormatFilters(request.filters, "Conference")
-
-        # If exists, sort on inequality filter first
-        if not inequality_filter:
-            q = q.order(Conference.name)
-        else:
-            q = q.order(ndb.GenericProperty(inequality_filter))
-            q = q.order(Conference.name)
-
-        return self._setFilters(q, filters)
+        """ Return formatted query from the submitted filters, see _planQuery."""
+        return self._planQuery(
+            Conference, self._checkAndFormatFilters(request.filters, "Conference"))
 
 # - - - Query for session - - - - - - - - - - - - - - - - - - - - - - -
 
@@ -677,14 +1013,7 @@ class ConferenceApi(remote.Service):
     def getConferenceSessions(self, request):
         """ Given a websafeKey of a conference, query for all the sessions in it."""
 
-        conference, conferenceKey = self._getConferenceFromWebsafeKey(request.websafeKey)
-
-        sessions = Session.query(ancestor=conferenceKey)
-
-        # return set of SessionForm objects per Session
-        return SessionForms(
-            items=[self._copySessionToForm(session) for session in sessions]
-        )
+        return self._queryConferenceSessionsAsync(request.websafeKey).get_result()
 
     @endpoints.method(GET_REQUEST_BY_CONFERENCE_WEBSAFEKEY_AND_TYPE_OF_SESSION, SessionForms,
                       path='sessions/{websafeKey}/{typeOfSession}',
@@ -694,18 +1023,30 @@ class ConferenceApi(remote.Service):
         """ Given a websafeKey of a conference and a type of session,
             return all sessions of that specified type and in that conference."""
 
-        conference, conferenceKey = self._getConferenceFromWebsafeKey(request.websafeKey)
+        return self._queryConferenceSessionsAsync(
+            request.websafeKey,
+            Session.typeOfSession == request.typeOfSession
+        ).get_result()
 
-        sessions = Session.query(Session.typeOfSession == request.typeOfSession)
+    @ndb.tasklet
+    def _queryConferenceSessionsAsync(self, websafeKey, *filters):
+        """ Return SessionForms of the sessions of a conference matching filters.
+            The conference is checked while its sessions are queried."""
 
-        # return set of SessionForm objects per Session filtered by
-        # conferenceKey
-        items = [sess.name for sess in sessions if (sess.key.parent() == conferenceKey)]
+        conferenceFuture = self._getConferenceFromWebsafeKeyAsync(websafeKey)
+        if websafeKey is None:
+            yield conferenceFuture  # raises NotFoundException
 
-        return SessionForms(
-            items=[self._copySessionToForm(sess) for sess in sessions
-                   if (sess.key.parent() == conferenceKey)]
-        )
+        # keys-only ancestor query, so only the sessions of this conference are
+        # scanned, then the sessions themselves mostly come from the cache
+        sessionsFuture = cache.queryEntitiesAsync(
+            Session.query(*filters, ancestor=ndb.Key(urlsafe=websafeKey)))
+
+        (conference, conferenceKey), sessions = yield conferenceFuture, sessionsFuture
+
+        # return set of SessionForm objects per Session
+        items = yield self._copySessionsToFormsAsync(sessions)
+        raise ndb.Return(SessionForms(items=items))
 
     @endpoints.method(message_types.VoidMessage, SessionForms,
                       path='getSessionsInWishlist',
@@ -713,15 +1054,32 @@ class ConferenceApi(remote.Service):
                       name='getSessionsInWishlist')
     def getSessionsInWishlist(self, request):
         """ Query for all the sessions the user is interested in."""
-        profile = self._getProfileFromUser()  # get user Profile
+        return self._getSessionsInWishlistAsync().get_result()
 
-        sessionKeys = [ndb.Key(urlsafe=sKey) for sKey in profile.wishlistOfSessionKeys]
-        sessions = ndb.get_multi(sessionKeys)
+    @ndb.tasklet
+    def _getSessionsInWishlistAsync(self, websafeKey=None):
+        """ Return SessionForms of the sessions in the user's wishlist, only
+            those of the conference given by websafeKey if there is one.
+            The conference is checked while the profile is fetched."""
+
+        if websafeKey is None:
+            profile = yield self._getProfileFromUserAsync()  # get user Profile
+            sessionKeys = [ndb.Key(urlsafe=sKey) for sKey in profile.wishlistOfSessionKeys]
+
+        else:
+            (conference, conferenceKey), profile = yield (
+                self._getConferenceFromWebsafeKeyAsync(websafeKey),
+                self._getProfileFromUserAsync()
+            )
+            # filter by conferenceKey before fetching the sessions
+            sessionKeys = [ndb.Key(urlsafe=sKey) for sKey in profile.wishlistOfSessionKeys]
+            sessionKeys = [key for key in sessionKeys if key.parent() == conferenceKey]
+
+        sessions = yield ndb.get_multi_async(sessionKeys)
 
         # return set of SessionForm objects per Session
-        return SessionForms(
-            items=[self._copySessionToForm(sess) for sess in sessions]
-        )
+        items = yield self._copySessionsToFormsAsync(sessions)
+        raise ndb.Return(SessionForms(items=items))
 
     @endpoints.method(GET_REQUEST_BY_CONFERENCE_WEBSAFEKEY, SessionForms,
                       path='getSessionsOfAConferenceInWishlist/{websafeKey}',
@@ -731,22 +1089,7 @@ class ConferenceApi(remote.Service):
         """ Given a websafeKey of a conference, query for all the sessions in it that
             the user is interested in."""
 
-        conference, conferenceKey = self._getConferenceFromWebsafeKey(
-            request.websafeKey)
-
-        profile = self._getProfileFromUser()  # get user Profile
-
-        sessionKeys = [ndb.Key(urlsafe=sKey) for sKey in profile.wishlistOfSessionKeys]
-        sessions = ndb.get_multi(sessionKeys)
-
-        conferenceKey = ndb.Key(urlsafe=request.websafeKey)
-
-        # return set of SessionForm objects per Session filtered by
-        # conferenceKey
-        return SessionForms(
-            items=[self._copySessionToForm(sess) for sess in sessions
-                   if (sess.key.parent() == conferenceKey)]
-        )
+        return self._getSessionsInWishlistAsync(request.websafeKey).get_result()
 
     @endpoints.method(GET_REQUEST_BY_SPEAKER, SessionForms,
                       path='sessions_by_speaker/{speaker}',
@@ -754,15 +1097,17 @@ class ConferenceApi(remote.Service):
                       name='getSessionsBySpeaker')
     def getSessionsBySpeaker(self, request):
         """ Given a speaker, return all sessions given by this particular speaker,
-            across all conferences. """
+            across all conferences, one page at a time. """
 
         speaker, speakerKey = self._getSpeakerKey(request.speaker)
 
-        sessions = ndb.get_multi(speaker.sessions)
+        sessions, nextPageToken = self._fetchPage(
+            Session.query(Session.speaker == speakerKey).order(Session.key), request)
 
         # return set of SessionForm objects per Session
         return SessionForms(
-            items=[self._copySessionToForm(sess) for sess in sessions]
+            items=self._copySessionsToForms(sessions),
+            nextPageToken=nextPageToken
         )
 
     @endpoints.method(QueryForms, SessionForms,
@@ -774,49 +1119,274 @@ class ConferenceApi(remote.Service):
             You can filter by these fields: NAME, SPEAKER, TYPE_OF_SESSION, DATE, START_TIME,
             END_TIME, LOCATION, using these operators: EQ, GT, GTEQ, LT, LTEQ, NE."""
 
-        sessions = self._getSessionQuery(request)
+        q, filters, postFilters, plan = self._getSessionQuery(request)
+        projection = self._getProjection(
+            request, filters, postFilters,
+            SESSION_SUMMARY_FIELDS, SESSION_SUMMARY_FILTERS)
+
+        # identical filter sets are answered from memcache
+        resultKey = cache.queryResultKey(
+            'Session', filters, *self._pageOptions(request, projection))
+        sessionForms = cache.getQueryResult(resultKey, SessionForms)
+        if sessionForms:
+            return sessionForms
+
+        sessions, nextPageToken = self._fetchPage(q, request, projection, postFilters)
 
         # return individual SessionForm object per Session
-        return SessionForms(
-            items=[self._copySessionToForm(sess) for sess in sessions]
+        sessionForms = SessionForms(
+            items=self._copyEqualityFilters(
+                self._copySessionsToForms(sessions),
+                filters, SESSION_SUMMARY_FIELDS, projection),
+            nextPageToken=nextPageToken,
+            queryPlan=plan
         )
+        cache.setQueryResult(resultKey, sessionForms)
+        return sessionForms
 
     def _getSessionQuery(self, request):
-        """ Return formatted query from the submitted filters."""
+        """ Return formatted query from the submitted filters, see _planQuery."""
+        return self._planQuery(
+            Session, self._checkAndFormatFilters(request.filters, "Session"))
+
+    def _planQuery(self, model, filters):
+        """ Plan the query on model for the parsed filters. Datastore allows
+            inequality filters on one property only, so the most selective of
+            them is run by datastore and the others are applied to the results
+            while they are streamed. Return a tuple of:
+            - q, the datastore query,
+            - filters, the parsed filters,
+            - postFilters, the filters left to apply in Python,
+            - plan, a description of the plan."""
+
+        # group the inequality filters by field, in the order they were given
+        inequalityFields = []
+        inequalities = {}
+        for filtr in filters:
+            if self._isInequality(filtr):
+                if filtr["field"] not in inequalities:
+                    inequalityFields.append(filtr["field"])
+                inequalities.setdefault(filtr["field"], []).append(filtr)
 
-        q = Session.query()
-        # Check and format the filters
-        inequality_filter, filters = self._checkAndFormatFilters(request.filters, "Session")
+        inequality_field = None
+        if inequalityFields:
+            inequality_field = min(
+                inequalityFields,
+                key=lambda field: self._selectivityRank(inequalities[field]))
 
-        # If exists, sort on inequality filter first
-        if not inequality_filter:
-            q = q.order(Session.name)
-        else:
-            q = q.order(ndb.GenericProperty(inequality_filter))
-            q = q.order(Session.name)
+        datastoreFilters = [filtr for filtr in filters if not self._isInequality(filtr) or
+                            filtr["field"] == inequality_field]
+        postFilters = [filtr for filtr in filters if filtr not in datastoreFilters]
 
-        return self._setFilters(q, filters)
+        # a post-filtered time range still narrows the datastore query by its
+        # hour bucket, an equality filter which combines with the inequality
+        # but needs its own indexes, see SESSION_TIME_BUCKET_FILTERS
+        if SESSION_TIME_BUCKET_FILTERS:
+            datastoreFilters += self._timeBucketFilters(postFilters, datastoreFilters)
 
-    def _setFilters(self, q, filters):
-        # Process filters and apply to q
+        q = model.query()
+
+        # If exists, sort on inequality filter first
+        if inequality_field:
+            q = q.order(ndb.GenericProperty(inequality_field))
+        q = q.order(model.name)
+
+        # key order is needed for cursors when "!=" splits the query in two
+        q = q.order(model.key)
+
+        plan = 'datastore: %s; order: %s' % (
+            self._describeFilters(datastoreFilters) or 'all',
+            ', '.join(filter(None, [inequality_field, 'name', 'key'])))
+        if postFilters:
+            plan += '; post-filter: %s' % self._describeFilters(postFilters)
+
+        return self._setFilters(q, datastoreFilters), filters, postFilters, plan
+
+    def _timeBucketFilters(self, postFilters, datastoreFilters):
+        """ Return an IN filter on the hour bucket for each time property with
+            a range in postFilters, unless the query would be split in more
+            than MAX_SUBQUERIES queries."""
+
+        subqueries = 2 if any(filtr["operator"] == "!=" for filtr in datastoreFilters) else 1
+        bucketFilters = []
+
+        for field, bucket in sorted(TIME_BUCKETS.items()):
+            lower, upper = 0, 23
+            for filtr in postFilters:
+                if filtr["field"] != field:
+                    continue
+                value = filtr["value"]
+                if filtr["operator"] in (">", ">="):
+                    lower = max(lower, value.hour)
+                elif filtr["operator"] == "<=":
+                    upper = min(upper, value.hour)
+                elif filtr["operator"] == "<":
+                    # "< 10:00:00" excludes the hour 10
+                    onTheHour = not (value.minute or value.second or value.microsecond)
+                    upper = min(upper, value.hour - 1 if onTheHour else value.hour)
+
+            hours = range(lower, upper + 1)
+            if len(hours) == 24 or subqueries * max(len(hours), 1) > MAX_SUBQUERIES:
+                continue
+            subqueries *= max(len(hours), 1)
+            bucketFilters.append({"field": bucket, "operator": "in", "value": hours})
+
+        return bucketFilters
+
+    def _isInequality(self, filtr):
+        """ Every operation except "=" is an inequality, and so is an equality
+            filter for date which is run as a range (see _setFilters)."""
+        return filtr["operator"] != "=" or filtr["field"] in DATE_FIELDS
+
+    def _selectivityRank(self, fieldFilters):
+        """ Rank the inequality filters of one field, lower is more selective:
+            a bounded range, then a one-sided range, then "!=" which excludes
+            little and runs as two queries."""
+
+        operators = [filtr["operator"] for filtr in fieldFilters]
+        if "=" in operators:
+            return 0  # equality for date, a range of one day
+        lower = ">" in operators or ">=" in operators
+        upper = "<" in operators or "<=" in operators
+        if lower and upper:
+            return 0
+        if lower or upper:
+            return 1
+        return 2
+
+    def _describeFilters(self, filters):
+        return ', '.join('%s %s %s' % (filtr["field"], filtr["operator"], filtr["value"])
+                         for filtr in filters)
+
+    def _matchesFilters(self, entity, filters):
+        """ Return True if entity passes all the filters, applied in Python
+            with the datastore semantics: a repeated property matches if any
+            of its values does, and None matches nothing."""
 
         for filtr in filters:
+            values = getattr(entity, filtr["field"])
+            if not isinstance(values, list):
+                values = [values]
+
+            matched = False
+            for value in values:
+                if value is None:
+                    continue
+                bound = filtr["value"]
+                # filter values for dates are parsed as datetime
+                if isinstance(bound, datetime) and not isinstance(value, datetime):
+                    bound = bound.date()
+                if filtr["field"] in DATE_FIELDS and filtr["operator"] == "=":
+                    matched = bound <= value < bound + timedelta(days=1)
+                else:
+                    matched = OPERATOR_FUNCTIONS[filtr["operator"]](value, bound)
+                if matched:
+                    break
+
+            if not matched:
+                return False
+        return True
+
+    def _getProjection(self, request, filters, postFilters, summaryFields,
+                       summaryFilters):
+        """ Return the properties to project for the view of request, None to
+            load full entities. Properties with an equality filter can't be
+            projected, _copyEqualityFilters sets them from the filter instead.
+            A projection query needs an index of its filters and projected
+            properties, so only the filter sets of index.yaml are projected:
+            none, or one equality filter on a field of summaryFilters. Other
+            filters, inequalities and post-filters load full entities, the
+            SUMMARY view is then the same as FULL."""
+
+        view = (request.view or 'FULL').upper()
+        if view not in VIEWS:
+            raise endpoints.BadRequestException(
+                "'view' must be one of %s" % ', '.join(VIEWS))
+        if view == 'FULL' or postFilters:
+            return None
+        if len(filters) > 1 or [filtr for filtr in filters
+                                if self._isInequality(filtr)
+                                or filtr["field"] not in summaryFilters]:
+            return None
+
+        projection = [field for field in summaryFields
+                      if field not in self._equalityFilters(filters)]
+        return projection or None
+
+    def _equalityFilters(self, filters):
+        """ Return {field: value} of the filters which are datastore equality
+            filters (an equality filter for date is run as a range)."""
+
+        return dict((filtr["field"], filtr["value"]) for filtr in filters
+                    if not self._isInequality(filtr))
+
+    def _copyEqualityFilters(self, forms, filters, summaryFields, projection):
+        """ Set in forms the summary fields left out of projection because of
+            an equality filter, their value is the one of the filter."""
+
+        if projection is None:
+            return forms
+
+        for field, value in self._equalityFilters(filters).items():
+            if field in summaryFields:
+                for form in forms:
+                    setattr(form, field, value)
+        return forms
+
+    def _pageOptions(self, request, projection):
+        """ Return the normalized options of request which shape a query result
+            besides its filters."""
+        return (request.pageSize or DEFAULT_PAGE_SIZE, request.pageToken, projection)
+
+    def _fetchPage(self, q, request, projection=None, postFilters=None):
+        """ Fetch one page of q using the pageSize and pageToken of request,
+            return the entities and the token of the next page (None if last).
+            With postFilters, the results are streamed until the page is full
+            or MAX_SCAN_PAGES pages were scanned, so a page may be short."""
+
+        pageSize = request.pageSize or DEFAULT_PAGE_SIZE
+        if pageSize < 1 or pageSize > MAX_PAGE_SIZE:
+            raise endpoints.BadRequestException(
+                "'pageSize' must be between 1 and %s" % MAX_PAGE_SIZE)
+
+        startCursor = None
+        if request.pageToken:
+            try:
+                startCursor = Cursor(urlsafe=request.pageToken)
+            except datastore_errors.BadValueError:
+                raise endpoints.BadRequestException(
+                    "Invalid pageToken: %s" % request.pageToken)
 
-            if filtr["field"] in ["startTime", "endTime"]:
-                filtr["value"] = datetime.strptime(filtr["value"], "%H:%M:%S")
+        if not postFilters:
+            entities, nextCursor, more = q.fetch_page(
+                pageSize, start_cursor=startCursor, projection=projection)
 
-            if filtr["field"] in ["speaker"]:
-                filtr["value"] = ndb.Key(urlsafe=filtr["value"])
+        else:
+            it = q.iter(start_cursor=startCursor, produce_cursors=True,
+                        projection=projection, batch_size=pageSize)
+            entities = []
+            scanned = 0
+            more = False
+            for entity in it:
+                scanned += 1
+                if self._matchesFilters(entity, postFilters):
+                    entities.append(entity)
+                if len(entities) == pageSize or scanned == pageSize * MAX_SCAN_PAGES:
+                    more = it.probably_has_next()
+                    break
+            nextCursor = it.cursor_after() if more else None
+
+        nextPageToken = None
+        if more and nextCursor:
+            nextPageToken = nextCursor.urlsafe()
+        return entities, nextPageToken
 
-            if filtr["field"] in ["month", "maxAttendees", "seatsAvailable"]:
-                filtr["value"] = int(filtr["value"])
+    def _setFilters(self, q, filters):
+        # Apply the parsed filters to q
 
-            if filtr["field"] in ["startDate", "endDate", "date"]:
-                # Change <type 'unicode'> to <type 'datetime.datetime'>
-                filtr["value"] = datetime.strptime(filtr["value"], "%Y-%m-%d")
+        for filtr in filters:
 
-            if (filtr["field"] in ["startDate", "endDate", "date"]) and (
-                    filtr["operator"] == "="):
+            if (filtr["field"] in DATE_FIELDS) and (filtr["operator"] == "="):
                 # Equal filter for date type must be changed into two inequal
                 # filters
                 formatted_query = ndb.query.FilterNode(
@@ -846,10 +1416,28 @@ class ConferenceApi(remote.Service):
 
         return q
 
+    def _parseFilterValue(self, filtr):
+        # Convert the value of the filter to the type of its field
+
+        if filtr["field"] in ["startTime", "endTime"]:
+            return datetime.strptime(filtr["value"], "%H:%M:%S")
+
+        if filtr["field"] in ["speaker"]:
+            return ndb.Key(urlsafe=filtr["value"])
+
+        if filtr["field"] in ["month", "maxAttendees", "seatsAvailable",
+                              "startHour", "startMinute", "dayOfWeek"]:
+            return int(filtr["value"])
+
+        if filtr["field"] in DATE_FIELDS:
+            # Change <type 'unicode'> to <type 'datetime.datetime'>
+            return datetime.strptime(filtr["value"], "%Y-%m-%d")
+
+        return filtr["value"]
+
     def _checkAndFormatFilters(self, filters, kind):
         """ Parse, check validity and format user supplied filters."""
         formatted_filters = []
-        inequality_field = None
 
         for f in filters:
 
@@ -867,26 +1455,16 @@ class ConferenceApi(remote.Service):
             except KeyError:
                 raise endpoints.BadRequestException("Filter contains invalid field or operator")
 
-            # Every operation except "=" is an inequality
-            # Every filter for date type is inequal because even equal filter for
-            # date type must be changed into two inequal filters (will be implemented
-            # in _setFilters function), e.g. date1==date2 is equivalent to (date1 >= date2)
-            # and (date1 < date2 + 24 hours (e.g. 1440 minutes))
-
-            if ((filtr["operator"] != "=") or
-                (filtr["field"] in ["startDate", "endDate", "date"])):
-                # Check if inequality operation has been used in previous filters
-                # Disallow the filter if inequality was performed on a different field before
-                # Track the field on which the inequality operation is
-                # performed
-                if inequality_field and inequality_field != filtr["field"]:
-                    raise endpoints.BadRequestException("Inequality filter is allowed on \
-                        only one field (Equality filter for date is considered as inequality)")
-                else:
-                    inequality_field = filtr["field"]
+            try:
+                filtr["value"] = self._parseFilterValue(filtr)
+            except Exception:
+                raise endpoints.BadRequestException(
+                    "Invalid value for %s: %s" % (filtr["field"], filtr["value"]))
 
+            # Inequality filters on more than one field are allowed, _planQuery
+            # leaves all but one of them to Python
             formatted_filters.append(filtr)
-        return (inequality_field, formatted_filters)
+        return formatted_filters
 
 # - - - - Additional queries - - - - - - - - - - - - - - - - - - - - - -
 
@@ -913,7 +1491,7 @@ class ConferenceApi(remote.Service):
         # q = q.filter(f)
 
         return ConferenceForms(
-            items=[self._copyConferenceToForm(conf, "") for conf in q]
+            items=[self._copyConferenceToForm(conf) for conf in q]
         )
 
     @endpoints.method(QueryProblemForm, SessionForms,
@@ -935,74 +1513,101 @@ class ConferenceApi(remote.Service):
         # q = Session.query(ndb.AND( (Session.startTime < startTime),
         #                            (Session.typeOfSession != request.typeOfSession) ))
         # but there are more than one inequality filter for more than one property,
-        # which is rejected by Datastore. So we have to solve by python.
-        # However, in general, we can avoid the query with more than one inequality filter 
-        # by modifying the data model. We can do that whenever we assume some query may be common.
-        # For example, all the sessions started after 7pm are late sessions,
-        # and we update the lateSession property to 'True' whenever we create a late session.
+        # which is rejected by Datastore. The query planner runs the more selective
+        # of them in Datastore and the other one in Python while streaming results.
+        filters = [
+            {"field": "startTime", "operator": "<", "value": startTime},
+            {"field": "typeOfSession", "operator": "!=", "value": request.typeOfSession},
+        ]
+        q, filters, postFilters, plan = self._planQuery(Session, filters)
 
-        if startTime == datetime.strptime("19:00:00", "%H:%M:%S"):
-            sessions = Session.query(
-                ndb.AND(
-                    Session.lateSession == True,
-                    Session.typeOfSession != request.typeOfSession
-                )
-            )
-
-        else:
-            # sessions start before given time
-            sessionsTime = Session.query(Session.startTime < startTime)
-
-            sessions = []
-            for session in sessionsTime:
-                if session.typeOfSession != request.typeOfSession:
-                    sessions.append(session)
+        sessions = (session for session in q if self._matchesFilters(session, postFilters))
 
         # return individual SessionForm object per session
         return SessionForms(
-            items=[self._copySessionToForm(session) for session in sessions]
+            items=self._copySessionsToForms(sessions),
+            queryPlan=plan
         )
 
-    def _additionalQuery1(self, month, year, speaker):
+    def _additionalQuery1(self, month, year, speakerKey):
         """ Return the free intervals for a given speaker in a given month of a year."""
 
-        # Get all the sessions given by the speaker
-        sessionKeys = speaker.sessions
-        sessionOfSpeaker = ndb.get_multi(sessionKeys)
-
         # busyDay will be a set of the days in this month and year
         # when the speaker has his or her session.
-        busyDay = Set()
-        for session in sessionOfSpeaker:
-            if (session.date.month == month) and (session.date.year == year):
-                busyDay.add(session.date.day)
-
-        if month in [1, 3, 5, 7, 8, 10, 12]:
-            days = 31
-        elif month == 2:
-            days = 28
-        else:
-            days = 30
+        speakerCalendar = self._calendarKey(speakerKey, year, month).get()
+        busyDay = self._busyDays(speakerCalendar, year, month)
+
+        days = range(1, calendar.monthrange(year, month)[1] + 1)
 
         # Get free intervals by eliminating busy days
-        freeIntervals = []
-        busyStatus = True
-        for day in range(1, days + 1):
-            if busyStatus:
-                if day not in busyDay:
-                    busyStatus = False
-                    startDate = str(day)
-            else:
-                if day in busyDay:
-                    endDate = str(day - 1)
-                    freeIntervals.append((startDate, endDate))
-                    busyStatus = True
-        if not busyStatus:
-            endDate = str(days)
-            freeIntervals.append((startDate, endDate))
+        return [(str(first), str(last)) for first, last in self._freeIntervals(days, busyDay)]
+
+    def _freeIntervals(self, days, busy):
+        """ Return the (first, last) pairs of the runs of consecutive days, in
+            the ordered list days, which are not in busy."""
 
+        freeIntervals = []
+        startDay = None
+        for index, day in enumerate(days):
+            if day in busy:
+                if startDay is not None:
+                    freeIntervals.append((startDay, days[index - 1]))
+                    startDay = None
+            elif startDay is None:
+                startDay = day
+        if startDay is not None:
+            freeIntervals.append((startDay, days[-1]))
         return freeIntervals
 
+    def _busyDays(self, speakerCalendar, year, month, asDates=False):
+        """ Return the set of the busy days of a month in speakerCalendar (None
+            when the speaker has no session that month), as day numbers or
+            as dates."""
+
+        busyDays = speakerCalendar.busyDays if speakerCalendar else 0
+        return Set(date(year, month, day) if asDates else day
+                   for day in range(1, calendar.monthrange(year, month)[1] + 1)
+                   if busyDays & (1 << (day - 1)))
+
+    @staticmethod
+    def _calendarKey(speakerKey, year, month):
+        """ Return the key of the SpeakerCalendar of a speaker for a month."""
+        return ndb.Key(SpeakerCalendar, '%04d-%02d' % (year, month), parent=speakerKey)
+
+    @staticmethod
+    def _scheduleBusyDays(busyDays):
+        """ Enqueue the marking of the busy days, bitmaps given by
+            SpeakerCalendar key, in the transaction of the caller."""
+
+        items = busyDays.items()
+        taskqueue.add(
+            params={
+                'calendar_websafeKey': [calendarKey.urlsafe() for calendarKey, days in items],
+                'busyDays': [days for calendarKey, days in items]
+            },
+            url='/tasks/mark_busy_days',
+            transactional=True
+        )
+
+    @staticmethod
+    def _markBusyDays(busyDays):
+        """ Add the busy days, bitmaps given by SpeakerCalendar key, to the
+            calendars, each one in its own transaction. Marking a day twice
+            changes nothing, so a retried task can run it again."""
+
+        @ndb.transactional_tasklet
+        def _mark(calendarKey, days):
+            speakerCalendar = yield calendarKey.get_async()
+            if speakerCalendar is None:
+                speakerCalendar = SpeakerCalendar(key=calendarKey)
+            if speakerCalendar.busyDays | days != speakerCalendar.busyDays:
+                speakerCalendar.busyDays |= days
+                yield speakerCalendar.put_async()
+
+        futures = [_mark(key, days) for key, days in busyDays.iteritems()]
+        for future in futures:
+            future.check_success()
+
     @endpoints.method(GET_REQUEST_FOR_SPARE_TIME_FOR_SPEAKER, IntervalForms,
                       path='additionalQuery1/{month}/{year}/{speakerKey}',
                       http_method='GET',
@@ -1016,13 +1621,58 @@ class ConferenceApi(remote.Service):
 
         speaker, speakerKey = self._getSpeakerKey(request.speakerKey)
 
-        freeIntervals = self._additionalQuery1(request.month, request.year, speaker)
+        freeIntervals = self._additionalQuery1(request.month, request.year, speakerKey)
 
         return IntervalForms(
             items=[IntervalForm(fromDate=interval[0], toDate=interval[1])
                    for interval in freeIntervals]
         )
 
+    @endpoints.method(GET_REQUEST_FOR_SPEAKERS_AVAILABILITY, IntervalForms,
+                      path='speakersAvailability',
+                      http_method='GET',
+                      name='speakersAvailability')
+    def speakersAvailability(self, request):
+        """ Query for the intervals (YYYY-MM-DD) from a month to another month
+            when all the given speakers are free."""
+
+        if not request.speakerKeys:
+            raise endpoints.BadRequestException("'speakerKeys' field required")
+        if (request.fromMonth not in range(1, 13) or request.toMonth not in range(1, 13) or
+            request.fromYear not in range(1, 3000) or request.toYear not in range(1, 3000)):
+            raise endpoints.BadRequestException("Invalid month or year")
+
+        months = [(year, month)
+                  for year in range(request.fromYear, request.toYear + 1)
+                  for month in range(1, 13)
+                  if (request.fromYear, request.fromMonth) <= (year, month) <=
+                     (request.toYear, request.toMonth)]
+        if not months or len(months) > MAX_AVAILABILITY_MONTHS:
+            raise endpoints.BadRequestException(
+                "The range must have from 1 to %s months" % MAX_AVAILABILITY_MONTHS)
+
+        speakerFutures = [self._getSpeakerKeyAsync(websafeKey)
+                          for websafeKey in Set(request.speakerKeys)]
+        speakerKeys = [future.get_result()[1] for future in speakerFutures]
+
+        # one calendar per speaker and month, all read at once
+        calendarKeys = [self._calendarKey(speakerKey, year, month)
+                        for speakerKey in speakerKeys for year, month in months]
+        busy = Set()
+        for calendarKey, speakerCalendar in zip(calendarKeys, ndb.get_multi(calendarKeys)):
+            year, month = map(int, calendarKey.id().split('-'))
+            busy |= self._busyDays(speakerCalendar, year, month, asDates=True)
+
+        firstDay = date(months[0][0], months[0][1], 1)
+        lastDay = date(months[-1][0], months[-1][1],
+                       calendar.monthrange(months[-1][0], months[-1][1])[1])
+        days = [firstDay + timedelta(days=i) for i in range((lastDay - firstDay).days + 1)]
+
+        return IntervalForms(
+            items=[IntervalForm(fromDate=first.isoformat(), toDate=last.isoformat())
+                   for first, last in self._freeIntervals(days, busy)]
+        )
+
     @endpoints.method(IntervalForm, SessionForms,
                       path='additionalQuery2',
                       http_method='GET',
@@ -1035,67 +1685,108 @@ class ConferenceApi(remote.Service):
         fromDate = datetime.strptime(request.fromDate, "%Y-%m-%d")
         toDate = datetime.strptime(request.toDate, "%Y-%m-%d")
 
-        # First, filter the sessions by date, it reduces the amount of data remarkably
-        sessions = Session.query(
-            ndb.AND(
-                Session.date >= fromDate,
-                Session.date <= toDate
-            )
-        )
+        if SESSION_SEATS_FLAG:
+            # the sessions keep whether their conference has seats left
+            sessions = Session.query(
+                ndb.AND(
+                    Session.conferenceHasSeats == True,
+                    Session.date >= fromDate,
+                    Session.date <= toDate
+                )
+            ).fetch()
 
-        conferenceKeys = [sess.key.parent() for sess in sessions]
-        conferences = ndb.get_multi(conferenceKeys)
+        else:
+            # First, filter the sessions by date, it reduces the amount of data remarkably
+            sessions = Session.query(
+                ndb.AND(
+                    Session.date >= fromDate,
+                    Session.date <= toDate
+                )
+            ).fetch()
 
-        # Second, filter by seat-available of conference
-        seatsAvailableConferenceKeys = [conf.key for conf in conferences if conf.seatsAvailable>0]
-        result = [sess for sess in sessions if sess.key.parent() in seatsAvailableConferenceKeys]
+            # Second, filter by seat-available of conference, each conference
+            # is read once even if it has many sessions in these days
+            conferenceKeys = list(Set(sess.key.parent() for sess in sessions))
+            conferences = cache.getEntitiesAsync(conferenceKeys).get_result()
+            seatsAvailableConferenceKeys = Set(
+                conf.key for conf in conferences if conf and conf.seatsAvailable > 0)
+            sessions = [sess for sess in sessions
+                        if sess.key.parent() in seatsAvailableConferenceKeys]
 
         return SessionForms(
-            items=[self._copySessionToForm(session) for session in result]
+            items=self._copySessionsToForms(sessions)
         )
 
 # - - - Registration/ unregistration for conference  - - - - - - - - - -
 
-    @ndb.transactional(xg=True)
     def _conferenceRegistration(self, request, reg=True):
-        """ Register or unregister user for selected conference."""
+        """ Register or unregister user for selected conference.
+            The seat is taken from (or given back to) one seat shard of the
+            conference, so concurrent registrations don't contend on the
+            Conference entity."""
+
+        conference, conferenceKey = self._getConferenceFromWebsafeKey(request.websafeKey)
+
+        # register
+        if reg:
+            # try the shards which still have seats until one of them has
+            # not been emptied by a concurrent registration meanwhile
+            for shardKey in seats.availableShardKeys(conference):
+                retval = self._updateRegistration(
+                    request.websafeKey, conferenceKey, shardKey, reg)
+                if retval is not None:
+                    break
+            else:
+                raise ConflictException("There are no seats available.")
+
+        # unregister
+        else:
+            retval = self._updateRegistration(
+                request.websafeKey, conferenceKey, seats.anyShardKey(conference), reg)
+
+        return BooleanMessage(data=retval)
+
+    @ndb.transactional(xg=True)
+    def _updateRegistration(self, websafeKey, conferenceKey, shardKey, reg):
+        """ Update the user profile and one seat shard atomically, return None
+            if the shard has no seat left."""
 
         retval = None
         profile = self._getProfileFromUser()  # get user Profile
-
-        conference, conferenceKey = self._getConferenceFromWebsafeKey(request.websafeKey)
+        shard = shardKey.get()
 
         # register
         if reg:
             # check if user already registered otherwise add
-            if request.websafeKey in profile.conferenceKeysToAttend:
+            if websafeKey in profile.conferenceKeysToAttend:
                 raise ConflictException("You have already registered for this conference")
 
-            # check if seats avail
-            if conference.seatsAvailable <= 0:
-                raise ConflictException("There are no seats available.")
+            # check if seats avail in this shard
+            if shard.seats <= 0:
+                return None
 
             # register user, take away one seat
-            profile.conferenceKeysToAttend.append(request.websafeKey)
-            conference.seatsAvailable -= 1
+            profile.conferenceKeysToAttend.append(websafeKey)
+            shard.seats -= 1
+            seats.seatsChanged(conferenceKey)
             retval = True
 
         # unregister
         else:
             # check if user already registered
-            if request.websafeKey in profile.conferenceKeysToAttend:
+            if websafeKey in profile.conferenceKeysToAttend:
                 # unregister user, add back one seat
-                profile.conferenceKeysToAttend.remove(request.websafeKey)
-                conference.seatsAvailable += 1
+                profile.conferenceKeysToAttend.remove(websafeKey)
+                shard.seats += 1
+                seats.seatsChanged(conferenceKey)
                 retval = True
 
             else:
-                retval = False
+                return False
 
         # write things back to the datastore & return
-        profile.put()
-        conference.put()
-        return BooleanMessage(data=retval)
+        ndb.put_multi([profile, shard])
+        return retval
 
     @endpoints.method(GET_REQUEST_BY_CONFERENCE_WEBSAFEKEY, BooleanMessage,
                       path='register_conference/{websafeKey}',
@@ -1120,63 +1811,43 @@ class ConferenceApi(remote.Service):
     def getConferencesToAttend(self, request):
         """ Get list of conferences that user has registered for."""
 
-        profile = self._getProfileFromUser()  # get user Profile
+        return self._getConferencesToAttendAsync().get_result()
+
+    @ndb.tasklet
+    def _getConferencesToAttendAsync(self):
+        """ Tasklet version of getConferencesToAttend."""
+
+        profile = yield self._getProfileFromUserAsync()  # get user Profile
 
         # Get conferenceKeysToAttend from profile.
         conferenceKeysToAttend = [ndb.Key(urlsafe=key)
                                   for key in profile.conferenceKeysToAttend]
 
-        # Fetch conferences from datastore.
-        conferences = ndb.get_multi(conferenceKeysToAttend)
-
-        names = self._getOrganizerNames(conferences)
+        # Fetch conferences from datastore, the organizer names are stored
+        # in them.
+        conferences = yield ndb.get_multi_async(conferenceKeysToAttend)
 
         # return set of ConferenceForm objects per Conference
-        return ConferenceForms(
-            items=[self._copyConferenceToForm(
-                conf,
-                names[conf.organizerUserId])
-                for conf in conferences]
-        )
+        raise ndb.Return(ConferenceForms(
+            items=[self._copyConferenceToForm(conf) for conf in conferences]
+        ))
 
 # - - - Announcements - - - - - - - - - - - - - - - - - - - - - - - - -
 
     @staticmethod
     def _cacheAnnouncement():
-        """ Create Announcement & assign to memcache; used by memcache cron job &
-            putAnnouncement()."""
-
-        conferences = Conference.query(
-            ndb.AND(
-                Conference.seatsAvailable <= 5,
-                Conference.seatsAvailable > 0
-            )
-        ).fetch(projection=[Conference.name])
-
-        if conferences:
-            # If there are almost sold out conferences, format announcement and set it in memcache
-            announcement = '%s %s' % (
-                'Last chance to attend! The following conferences are nearly sold out:',
-                ', '.join(conf.name for conf in conferences)
-            )
-            memcache.set(MEMCACHE_ANNOUNCEMENTS_KEY, announcement)
-        else:
-            # If there are no sold out conferences,
-            # delete the memcache announcements entry
-            announcement = ""
-            memcache.delete(MEMCACHE_ANNOUNCEMENTS_KEY)
-
-        return announcement
+        """ Rebuild the Announcement & assign to memcache; used by memcache cron job &
+            putAnnouncement(). The announcement is otherwise kept up to date
+            when the seats of a conference change (see announcements.py)."""
+        return announcements.rebuildAnnouncement()
 
     @endpoints.method(message_types.VoidMessage, StringMessage,
                       path='getAnnouncement',
                       http_method='GET', name='getAnnouncement')
     def getAnnouncement(self, request):
-        """ Return Announcement from memcache."""
+        """ Return Announcement from memcache, or datastore if it was evicted."""
 
-        return StringMessage(
-            data=memcache.get(MEMCACHE_ANNOUNCEMENTS_KEY) or ""
-        )
+        return StringMessage(data=announcements.getAnnouncement())
 
     @endpoints.method(message_types.VoidMessage, StringMessage,
                       path='putAnnouncement',
@@ -1196,72 +1867,333 @@ class ConferenceApi(remote.Service):
             data=memcache.get(MEMCACHE_FEATURED_SPEAKER_KEY) or ""
         )
 
+    @endpoints.method(GET_REQUEST_BY_CONFERENCE_WEBSAFEKEY, StringMessage,
+                      path='getFeaturedSpeaker/{websafeKey}',
+                      http_method='GET', name='getConferenceFeaturedSpeaker')
+    def getConferenceFeaturedSpeaker(self, request):
+        """ Returns featured speaker and sessions of a conference."""
+
+        conference, conferenceKey = self._getConferenceFromWebsafeKey(request.websafeKey)
+
+        cacheKey = MEMCACHE_CONFERENCE_FEATURED_SPEAKER_KEY % conferenceKey.urlsafe()
+        featuredSpeakerText = memcache.get(cacheKey)
+        if featuredSpeakerText is None:
+            featured = ndb.Key(FeaturedSpeaker, 'featured', parent=conferenceKey).get()
+            featuredSpeakerText = featured.text if featured else ""
+            memcache.add(cacheKey, featuredSpeakerText)
+
+        return StringMessage(data=featuredSpeakerText)
+
 # - - - Auxiliary methods - - - - - - - - - - - - - - - - - - - - - - -
 # Often combine with validating when getting the required values
 
     @staticmethod
     def _getConferenceFromWebsafeKey(websafeKey):
+        return ConferenceApi._getConferenceFromWebsafeKeyAsync(websafeKey).get_result()
+
+    @staticmethod
+    @ndb.tasklet
+    def _getConferenceFromWebsafeKeyAsync(websafeKey):
         if websafeKey is None:
             raise endpoints.NotFoundException("You must enter a Conference Key.")
 
         conferenceKey = ndb.Key(urlsafe=websafeKey)
-        conference = conferenceKey.get()
+        conference = yield cache.getEntityAsync(conferenceKey)
 
         # Verify if the websafeKey is of a Conference object
         if (not conference) or (type(conference).__name__ != "Conference"):
             raise endpoints.NotFoundException("Invalid Conference Key: %s" % websafeKey)
 
-        return conference, conferenceKey
+        raise ndb.Return((conference, conferenceKey))
 
     @staticmethod
     def _getSessionFromWebsafeKey(websafeKey):
+        return ConferenceApi._getSessionFromWebsafeKeyAsync(websafeKey).get_result()
+
+    @staticmethod
+    @ndb.tasklet
+    def _getSessionFromWebsafeKeyAsync(websafeKey):
         if websafeKey is None:
             raise endpoints.NotFoundException("You must enter a Session Key.")
 
         sessionKey = ndb.Key(urlsafe=websafeKey)
-        session = sessionKey.get()
+        session = yield cache.getEntityAsync(sessionKey)
 
         # Verify if the websafeKey is of a Session object
         if (not session or
             type(session).__name__ != "Session"):
             raise endpoints.NotFoundException("Invalid Session Key: %s" % websafeKey)
 
-        return session, sessionKey
+        raise ndb.Return((session, sessionKey))
 
     @staticmethod
     def _getSpeakerKey(websafeKey):
+        return ConferenceApi._getSpeakerKeyAsync(websafeKey).get_result()
+
+    @staticmethod
+    @ndb.tasklet
+    def _getSpeakerKeyAsync(websafeKey):
         if websafeKey is None:
             raise endpoints.NotFoundException("You must enter a Speaker Key.")
 
         speakerKey = ndb.Key(urlsafe=websafeKey)
-        speaker = speakerKey.get()
+        speaker = yield cache.getEntityAsync(speakerKey)
 
         # Verify if the speakerKey is valid
         if (not speaker) or (type(speaker).__name__ != "Speaker"):
             raise endpoints.NotFoundException("Invalid Speaker Key: %s" % websafeKey)
 
-        return speaker, speakerKey
+        raise ndb.Return((speaker, speakerKey))
 
     @classmethod
     def _setFeaturedSpeaker(cls, speaker_websafeKey, conference_websafeKey):
-        """ Setting featured speaker and sessions."""
+        """ Setting featured speaker and sessions.
+            The sessions of each speaker in a conference are kept in a
+            SpeakerSessions entity, updated from the sessions of the speaker in
+            this conference only, whatever the number of sessions the speaker
+            gave before."""
+
+        speakerFuture = cls._getSpeakerKeyAsync(speaker_websafeKey)
+        conferenceFuture = cls._getConferenceFromWebsafeKeyAsync(conference_websafeKey)
+        speaker, speakerKey = speakerFuture.get_result()
+        conference, conferenceKey = conferenceFuture.get_result()
+
+        sessionsKey = ndb.Key(SpeakerSessions, speakerKey.urlsafe(), parent=conferenceKey)
+        featuredKey = ndb.Key(FeaturedSpeaker, 'featured', parent=conferenceKey)
+
+        # all in the entity group of the conference, the ancestor query sees
+        # every session already written
+        @ndb.transactional
+        def _addSessions():
+            sessions = Session.query(Session.speaker == speakerKey,
+                                     ancestor=conferenceKey).fetch(
+                projection=[Session.name])
+            sessionsBySpeaker, featured = ndb.get_multi([sessionsKey, featuredKey])
+            if sessionsBySpeaker is None:
+                sessionsBySpeaker = SpeakerSessions(key=sessionsKey)
+
+            # the sessions already counted keep their order
+            newSessions = [session for session in sessions
+                           if session.key not in sessionsBySpeaker.sessionKeys]
+            if not newSessions:
+                return featured
+
+            for session in newSessions:
+                sessionsBySpeaker.sessionKeys.append(session.key)
+                sessionsBySpeaker.sessionNames.append(session.name)
+            entities = [sessionsBySpeaker]
+
+            if len(sessionsBySpeaker.sessionKeys) > 1:
+                featured = FeaturedSpeaker(
+                    key=featuredKey,
+                    text=speaker.name + ': ' + ', '.join(sessionsBySpeaker.sessionNames))
+                entities.append(featured)
+
+            ndb.put_multi(entities)
+            return featured
+
+        featured = _addSessions()
+        if featured:
+            # set featuredSpeakerText in memcache
+            memcache.set_multi({
+                MEMCACHE_FEATURED_SPEAKER_KEY: featured.text,
+                MEMCACHE_CONFERENCE_FEATURED_SPEAKER_KEY % conferenceKey.urlsafe(): featured.text
+            })
 
-        speaker, speakerKey = cls._getSpeakerKey(speaker_websafeKey)
-        conference, conferenceKey = cls._getConferenceFromWebsafeKey(conference_websafeKey)
+    @staticmethod
+    def _updateOrganizerDisplayName(profile_websafeKey):
+        """ Copy the display name of a profile into the conferences it organizes."""
 
-        sessionsBySpeaker = ndb.get_multi(speaker.sessions)
+        profile = ndb.Key(urlsafe=profile_websafeKey).get()
+        if not profile:
+            return
 
-        sessionsInSameConference = []
-        for session in sessionsBySpeaker:
-            if session.key.parent() == conference.key:
-                sessionsInSameConference.append(session)
+        q = Conference.query(ancestor=profile.key)
+        cursor, more = None, True
+        while more:
+            conferenceKeys, cursor, more = q.fetch_page(
+                BATCH_SIZE, start_cursor=cursor, keys_only=True)
+            ConferenceApi._setOrganizerDisplayNames(
+                dict((key, profile.displayName) for key in conferenceKeys))
 
-        if len(sessionsInSameConference) > 1:
-            sessionNames = [session.name for session in sessionsInSameConference]
-            featuredSpeakerText = speaker.name + ': ' + ', '.join(sessionNames)
+    @staticmethod
+    def _migrateOrganizerDisplayNames(websafeCursor=None):
+        """ Store the organizer name in one batch of conferences created before
+            Conference.organizerDisplayName, return the cursor of the next
+            batch or None when all conferences are done."""
+
+        startCursor = Cursor(urlsafe=websafeCursor) if websafeCursor else None
+        conferences, cursor, more = Conference.query().fetch_page(
+            BATCH_SIZE, start_cursor=startCursor)
+
+        # the organizer profiles are the parents of the conference keys
+        missing = [conf.key for conf in conferences if conf.organizerDisplayName is None]
+        organizers = ndb.get_multi([key.parent() for key in missing])
+        ConferenceApi._setOrganizerDisplayNames(
+            dict((key, organizer.displayName)
+                 for key, organizer in zip(missing, organizers) if organizer))
+
+        if more and cursor:
+            return cursor.urlsafe()
+        return None
 
-            # set featuredSpeakerText in memcache
-            memcache.set(MEMCACHE_FEATURED_SPEAKER_KEY, featuredSpeakerText)
+    @staticmethod
+    def _migrateSessionTimeBuckets(websafeCursor=None):
+        """ Store the time buckets in one batch of sessions created before
+            them, return the cursor of the next batch or None when all
+            sessions are done."""
+
+        startCursor = Cursor(urlsafe=websafeCursor) if websafeCursor else None
+        sessions, cursor, more = Session.query().fetch_page(
+            BATCH_SIZE, start_cursor=startCursor)
+
+        def _needsBuckets(session):
+            return session.startMinute is None and session.startTime
+
+        def _setBuckets(session):
+            if not _needsBuckets(session):
+                return False
+            session.populate(**ConferenceApi._sessionTimeBuckets(
+                session.date, session.startTime, session.endTime or session.startTime))
+            return True
+
+        ConferenceApi._updateSessions(
+            [session.key for session in sessions if _needsBuckets(session)], _setBuckets)
+
+        if more and cursor:
+            return cursor.urlsafe()
+        return None
+
+    @staticmethod
+    def _updateSessionSeatsFlag(conference_websafeKey):
+        """ Copy whether a conference has seats left into its sessions."""
+
+        conference = ndb.Key(urlsafe=conference_websafeKey).get()
+        if conference:
+            ConferenceApi._setSessionSeatsFlag(conference)
+
+    @staticmethod
+    def _setSessionSeatsFlag(conference):
+        hasSeats = (conference.seatsAvailable or 0) > 0
+
+        def _setFlag(sess):
+            if sess.conferenceHasSeats == hasSeats:
+                return False
+            sess.conferenceHasSeats = hasSeats
+            return True
+
+        ConferenceApi._updateSessions(
+            [sess.key for sess in Session.query(ancestor=conference.key)
+             if sess.conferenceHasSeats != hasSeats], _setFlag)
+
+    @staticmethod
+    def _updateSessions(sessionKeys, update):
+        """ Apply update, which changes a Session and returns True if it did,
+            to the sessions of sessionKeys, each one in its own transaction so
+            a concurrent update of another property is not overwritten. The
+            sessions of a conference share its entity group, so they are
+            updated one after another."""
+
+        @ndb.transactional_tasklet
+        def _updateSession(sessionKey):
+            session = yield sessionKey.get_async()
+            if session and update(session):
+                yield session.put_async()
+                cache.invalidate(sessionKey)
+
+        @ndb.tasklet
+        def _updateConferenceSessions(keys):
+            for key in keys:
+                yield _updateSession(key)
+
+        byConference = {}
+        for key in sessionKeys:
+            byConference.setdefault(key.parent(), []).append(key)
+        futures = [_updateConferenceSessions(keys) for keys in byConference.values()]
+        for future in futures:
+            future.check_success()
+
+    @staticmethod
+    def _migrateSessionSeatsFlag(websafeCursor=None):
+        """ Store conferenceHasSeats in the sessions of one batch of
+            conferences, return the cursor of the next batch or None when all
+            conferences are done."""
+
+        startCursor = Cursor(urlsafe=websafeCursor) if websafeCursor else None
+        conferences, cursor, more = Conference.query().fetch_page(
+            BATCH_SIZE, start_cursor=startCursor)
+
+        for conference in conferences:
+            ConferenceApi._setSessionSeatsFlag(conference)
+
+        if more and cursor:
+            return cursor.urlsafe()
+        return None
+
+    @staticmethod
+    def _migrateSpeakerCalendars(websafeCursor=None):
+        """ Mark the days of one batch of sessions in the calendars of their
+            speakers, return the cursor of the next batch or None when all
+            sessions are done."""
+
+        startCursor = Cursor(urlsafe=websafeCursor) if websafeCursor else None
+        sessions, cursor, more = Session.query().fetch_page(
+            BATCH_SIZE, start_cursor=startCursor)
+
+        busyDays = {}
+        for session in sessions:
+            if session.date:
+                calendarKey = ConferenceApi._calendarKey(
+                    session.speaker, session.date.year, session.date.month)
+                busyDays[calendarKey] = busyDays.get(calendarKey, 0) | (1 << (session.date.day - 1))
+        ConferenceApi._markBusyDays(busyDays)
+
+        if more and cursor:
+            return cursor.urlsafe()
+        return None
+
+    @staticmethod
+    def _migrateSpeakerSessions(websafeCursor=None):
+        """ Drop the list of session keys, now answered by a query, from one
+            batch of speakers, return the cursor of the next batch or None
+            when all speakers are done."""
+
+        startCursor = Cursor(urlsafe=websafeCursor) if websafeCursor else None
+        speakers, cursor, more = Speaker.query().fetch_page(
+            BATCH_SIZE, start_cursor=startCursor)
+
+        # the property is not in the model anymore, so ndb loads it as a
+        # generic property of the entity and would write it back
+        changed = []
+        for speaker in speakers:
+            if 'sessions' in speaker._properties:
+                del speaker._properties['sessions']
+                speaker._values.pop('sessions', None)
+                changed.append(speaker)
+        if changed:
+            ndb.put_multi(changed)
+            cache.invalidate(*[speaker.key for speaker in changed])
+
+        if more and cursor:
+            return cursor.urlsafe()
+        return None
+
+    @staticmethod
+    def _setOrganizerDisplayNames(names):
+        """ Store the organizer names given by conference key, each one in its
+            own transaction so a concurrent seats update is not overwritten."""
+
+        @ndb.transactional_tasklet
+        def _setName(conferenceKey, displayName):
+            conference = yield conferenceKey.get_async()
+            if conference and conference.organizerDisplayName != displayName:
+                conference.organizerDisplayName = displayName
+                yield conference.put_async()
+                cache.invalidate(conferenceKey)
+
+        futures = [_setName(key, name) for key, name in names.iteritems()]
+        for future in futures:
+            future.check_success()
 
 # registers API
-api = endpoints.api_server([ConferenceApi])
+api = logRpcCount(endpoints.api_server([ConferenceApi]))
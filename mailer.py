@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+
+"""
+mailer.py -- Udacity conference server-side Python App Engine
+    batch mailer for the conference confirmation emails
+
+$Id$
+
+created on 2026 oct 17
+
+Confirmation emails are queued as tasks of the MAIL_QUEUE pull queue. A
+cron job leases them by batches, merges the tasks of each organizer into a
+single email and sends at most MAIL_RATE emails per second through a mail
+backend. The task of an email which could not be sent is leased again when
+its lease expires, until it was tried MAX_MAIL_RETRIES times.
+
+"""
+
+import json
+import logging
+import time
+from collections import OrderedDict
+from string import Template
+
+from google.appengine.api import app_identity
+from google.appengine.api import mail
+from google.appengine.api import taskqueue
+
+from settings import MAIL_BACKEND
+
+MAIL_QUEUE = 'mail'
+MAIL_BATCH_SIZE = 100  # tasks leased at once
+MAIL_LEASE_SECONDS = 300
+MAIL_RATE = 10  # emails per second
+MAX_MAIL_RETRIES = 5
+
+CONFERENCE_FIELDS = ('name', 'city', 'startDate', 'endDate', 'maxAttendees')
+
+SUBJECT = 'You created a new Conference!'
+BODY = Template('Hi, you have created the following conference:\r\n\r\n$conferences')
+CONFERENCE = Template('$name in $city, from $startDate to $endDate, '
+                      'for $maxAttendees attendees')
+
+
+class AppEngineMailBackend(object):
+    """ AppEngineMailBackend -- sends the emails with the App Engine mail API."""
+
+    def send(self, to, subject, body):
+        mail.send_mail(
+            'noreply@%s.appspotmail.com' % app_identity.get_application_id(),
+            to, subject, body)
+
+
+class StubMailBackend(object):
+    """ StubMailBackend -- keeps the emails in sent and logs them instead of
+        sending them, to run the mailer locally."""
+
+    def __init__(self):
+        self.sent = []
+
+    def send(self, to, subject, body):
+        logging.info('Stub email to %s: %s\n%s', to, subject, body)
+        self.sent.append((to, subject, body))
+
+
+MAIL_BACKENDS = {
+    'appengine': AppEngineMailBackend,
+    'stub': StubMailBackend,
+}
+
+# the backend of MAIL_BACKEND, one per instance so the emails kept by the
+# stub can be read after the cron ran
+backend = MAIL_BACKENDS[MAIL_BACKEND]()
+
+
+def queueConfirmation(email, conferenceForms):
+    """ Queue the confirmation email of the conferences, given by their
+        ConferenceForms, created by the organizer with this email."""
+
+    payload = json.dumps({
+        'email': email,
+        'conferences': [dict((field, getattr(form, field)) for field in CONFERENCE_FIELDS
+                             if getattr(form, field) not in (None, 'None'))
+                        for form in conferenceForms]
+    })
+    taskqueue.Queue(MAIL_QUEUE).add(taskqueue.Task(payload=payload, method='PULL'))
+
+
+def renderBody(conferences):
+    """ Return the body of the email for conferences (dicts of CONFERENCE_FIELDS)."""
+
+    return BODY.substitute(conferences='\r\n'.join(
+        CONFERENCE.substitute(dict((field, conference.get(field) or '-')
+                                   for field in CONFERENCE_FIELDS))
+        for conference in conferences))
+
+
+def sendQueuedEmails(mailBackend=None):
+    """ Lease one batch of tasks, send one email per organizer and delete the
+        tasks of the emails sent; return the number of tasks leased."""
+
+    mailBackend = mailBackend or backend
+    queue = taskqueue.Queue(MAIL_QUEUE)
+    tasks = queue.lease_tasks(MAIL_LEASE_SECONDS, MAIL_BATCH_SIZE)
+
+    # email -> tasks and conferences of the organizer
+    emails = OrderedDict()
+    done = []
+    for task in tasks:
+        try:
+            data = json.loads(task.payload)
+            emails.setdefault(data['email'], []).append((task, data['conferences']))
+        except (ValueError, KeyError):
+            logging.error('Dropping invalid mail task %s', task.name)
+            done.append(task)
+
+    for email, entries in emails.iteritems():
+        conferences = [conference for task, taskConferences in entries
+                       for conference in taskConferences]
+        try:
+            mailBackend.send(email, SUBJECT, renderBody(conferences))
+            done += [task for task, taskConferences in entries]
+        except Exception:
+            logging.exception('Could not send the email to %s', email)
+            # keep the tasks, they are leased again when the lease expires
+            for task, taskConferences in entries:
+                if task.retry_count >= MAX_MAIL_RETRIES:
+                    logging.error('Dropping mail task %s after %s tries',
+                                  task.name, task.retry_count)
+                    done.append(task)
+        time.sleep(1.0 / MAIL_RATE)
+
+    if done:
+        queue.delete_tasks(done)
+    return len(tasks)
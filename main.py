@@ -12,10 +12,16 @@ created by wesc on 2014 may 24
 
 __author__ = 'wesc+api@google.com (Wesley Chun)'
 
+import time
 import webapp2
 from google.appengine.api import app_identity
 from google.appengine.api import mail
+from google.appengine.api import taskqueue
+from google.appengine.ext import ndb
 from conference import ConferenceApi
+import mailer
+import seats
+from utils import logRpcCount
 
 class SetAnnouncementHandler(webapp2.RequestHandler):
 
@@ -29,7 +35,8 @@ class SetAnnouncementHandler(webapp2.RequestHandler):
 class SendConfirmationEmailHandler(webapp2.RequestHandler):
 
     def post(self):
-        """ Send email confirming Conference creation."""
+        """ Send email confirming Conference creation.
+            Kept for the tasks enqueued before the mail pull queue."""
         
         mail.send_mail(
             'noreply@%s.appspotmail.com' % (
@@ -37,9 +44,23 @@ class SendConfirmationEmailHandler(webapp2.RequestHandler):
             self.request.get('email'),                  # to
             'You created a new Conference!',            # subj
             'Hi, you have created a following '         # body
-            'conference:\r\n\r\n%s' % self.request.get('conferenceInfo')
+            'conference:\r\n\r\n%s' % '\r\n\r\n'.join(
+                self.request.get_all('conferenceInfo'))
         )
 
+class SendEmailsHandler(webapp2.RequestHandler):
+
+    # the cron job runs every minute, a run stops leasing after this time
+    TIME_BUDGET = 50  # seconds
+
+    def get(self):
+        """ Send the queued confirmation emails, batch after batch."""
+
+        deadline = time.time() + self.TIME_BUDGET
+        while time.time() < deadline and mailer.sendQueuedEmails():
+            pass
+        self.response.set_status(204)
+
 class setFeaturedSpeakerHandler(webapp2.RequestHandler):
 
     def post(self):
@@ -51,8 +72,87 @@ class setFeaturedSpeakerHandler(webapp2.RequestHandler):
         )
         self.response.set_status(204)
 
-app = webapp2.WSGIApplication([
+class SyncSeatsAvailableHandler(webapp2.RequestHandler):
+
+    def post(self):
+        """ Copy the seats left in the shards into the Conference."""
+
+        seats.syncSeatsAvailable(
+            ndb.Key(urlsafe=self.request.get('conference_websafeKey'))
+        )
+        self.response.set_status(204)
+
+class MarkBusyDaysHandler(webapp2.RequestHandler):
+
+    def post(self):
+        """ Mark the days of new sessions busy in the speaker calendars."""
+
+        ConferenceApi._markBusyDays(dict(
+            (ndb.Key(urlsafe=calendarKey), int(days))
+            for calendarKey, days in zip(self.request.get_all('calendar_websafeKey'),
+                                         self.request.get_all('busyDays'))
+        ))
+        self.response.set_status(204)
+
+class UpdateOrganizerDisplayNameHandler(webapp2.RequestHandler):
+
+    def post(self):
+        """ Copy a changed profile name into the organized conferences."""
+
+        ConferenceApi._updateOrganizerDisplayName(
+            self.request.get('profile_websafeKey')
+        )
+        self.response.set_status(204)
+
+
+class UpdateSessionSeatsFlagHandler(webapp2.RequestHandler):
+
+    def post(self):
+        """ Copy whether a conference has seats left into its sessions."""
+
+        ConferenceApi._updateSessionSeatsFlag(
+            self.request.get('conference_websafeKey')
+        )
+        self.response.set_status(204)
+
+
+class MigrateHandler(webapp2.RequestHandler):
+
+    # migration name -> function migrating one batch from a cursor, returning
+    # the cursor of the next batch or None once done
+    MIGRATIONS = {
+        'organizer_display_name': ConferenceApi._migrateOrganizerDisplayNames,
+        'session_time_buckets': ConferenceApi._migrateSessionTimeBuckets,
+        'session_seats_flag': ConferenceApi._migrateSessionSeatsFlag,
+        'speaker_calendars': ConferenceApi._migrateSpeakerCalendars,
+        'speaker_sessions': ConferenceApi._migrateSpeakerSessions,
+    }
+
+    def get(self, name):
+        """ Start a migration of the existing entities."""
+        self.post(name)
+
+    def post(self, name):
+        """ Migrate one batch, then enqueue the next batch."""
+
+        if name not in self.MIGRATIONS:
+            self.abort(404)
+        cursor = self.MIGRATIONS[name](self.request.get('cursor') or None)
+        if cursor:
+            taskqueue.add(
+                params={'cursor': cursor},
+                url='/tasks/migrate/%s' % name
+            )
+        self.response.set_status(204)
+
+app = logRpcCount(webapp2.WSGIApplication([
     ('/crons/set_announcement', SetAnnouncementHandler),
+    ('/crons/send_emails', SendEmailsHandler),
     ('/tasks/send_confirmation_email', SendConfirmationEmailHandler),
-    ('/tasks/setFeaturedSpeaker', setFeaturedSpeakerHandler)
-], debug=True)
+    ('/tasks/setFeaturedSpeaker', setFeaturedSpeakerHandler),
+    ('/tasks/sync_seats_available', SyncSeatsAvailableHandler),
+    ('/tasks/mark_busy_days', MarkBusyDaysHandler),
+    ('/tasks/update_organizer_display_name', UpdateOrganizerDisplayNameHandler),
+    ('/tasks/update_session_seats_flag', UpdateSessionSeatsFlagHandler),
+    (r'/tasks/migrate/(\w+)', MigrateHandler)
+], debug=True))
@@ -78,7 +78,6 @@ class Speaker(ndb.Model):
     emails   = ndb.StringProperty(repeated=True)
     website  = ndb.StringProperty()
     company  = ndb.StringProperty()
-    sessions = ndb.KeyProperty(kind='Session', repeated=True)
 
     def __init__(self, *args, **kwds):
         super(Speaker, self).__init__(*args, **kwds)
@@ -102,6 +101,13 @@ class Speaker(ndb.Model):
                     raise endpoints.BadRequestException("Invalid email.")
 
 
+class SpeakerCalendar(ndb.Model):
+    """ SpeakerCalendar -- busy days of a speaker in one month, a child of the
+        Speaker with id YYYY-MM. Bit d-1 of busyDays is set when the speaker
+        has a session on day d."""
+    busyDays = ndb.IntegerProperty(default=0, indexed=False)
+
+
 class SpeakerForm(messages.Message):
     """ SpeakerForm -- Speaker outbound form message."""
     name       = messages.StringField(1, required=True)
@@ -109,13 +115,13 @@ class SpeakerForm(messages.Message):
     emails     = messages.StringField(3, repeated=True)
     website    = messages.StringField(4)
     company    = messages.StringField(5)
-    sessions   = messages.StringField(6, repeated=True)
     websafeKey = messages.StringField(7)
 
 
 class SpeakerForms(messages.Message):
     """ SpeakerForms -- multiple Speaker outbound form message."""
-    items = messages.MessageField(SpeakerForm, 1, repeated=True)
+    items         = messages.MessageField(SpeakerForm, 1, repeated=True)
+    nextPageToken = messages.StringField(2)
 
 
 class Conference(ndb.Model):
@@ -130,6 +136,32 @@ class Conference(ndb.Model):
     maxAttendees    = ndb.IntegerProperty()
     seatsAvailable  = ndb.IntegerProperty()
     organizerUserId = ndb.StringProperty()
+    organizerDisplayName = ndb.StringProperty()
+
+
+class SeatShard(ndb.Model):
+    """ SeatShard -- one shard of the available seats of a conference."""
+    seats = ndb.IntegerProperty(default=0, indexed=False)
+
+
+class SpeakerSessions(ndb.Model):
+    """ SpeakerSessions -- sessions of one speaker in one conference, a child
+        of the Conference with the websafe key of the speaker as id."""
+    sessionKeys  = ndb.KeyProperty(kind='Session', repeated=True, indexed=False)
+    sessionNames = ndb.StringProperty(repeated=True, indexed=False)
+
+
+class FeaturedSpeaker(ndb.Model):
+    """ FeaturedSpeaker -- featured speaker and sessions of a conference, a
+        child of the Conference with id 'featured'."""
+    text = ndb.StringProperty(indexed=False)
+
+
+class Announcement(ndb.Model):
+    """ Announcement -- the nearly sold out conferences, kept up to date as
+        their seats change."""
+    conferenceKeys  = ndb.KeyProperty(kind='Conference', repeated=True, indexed=False)
+    conferenceNames = ndb.StringProperty(repeated=True, indexed=False)
 
 
 class ConferenceForm(messages.Message):
@@ -150,7 +182,9 @@ class ConferenceForm(messages.Message):
 
 class ConferenceForms(messages.Message):
     """ ConferenceForms -- multiple Conference outbound form message."""
-    items = messages.MessageField(ConferenceForm, 1, repeated=True)
+    items         = messages.MessageField(ConferenceForm, 1, repeated=True)
+    nextPageToken = messages.StringField(2)
+    queryPlan     = messages.StringField(3)
 
 
 class QueryForm(messages.Message):
@@ -168,7 +202,10 @@ class QueryProblemForm(messages.Message):
 
 class QueryForms(messages.Message):
     """ QueryForms -- multiple QueryForm inbound form message."""
-    filters = messages.MessageField(QueryForm, 1, repeated=True)
+    filters   = messages.MessageField(QueryForm, 1, repeated=True)
+    pageSize  = messages.IntegerField(2)
+    pageToken = messages.StringField(3)
+    view      = messages.StringField(4)
 
 
 class StringMessage(messages.Message):
@@ -187,6 +224,14 @@ class Session(ndb.Model):
     location      = ndb.StringProperty()
     speaker       = ndb.KeyProperty(kind='Speaker', required=True)
     lateSession   = ndb.BooleanProperty()
+    # time buckets computed on write, so time windows can be queried with
+    # equality filters; minutes are counted from midnight, Monday is day 0
+    startMinute   = ndb.IntegerProperty()
+    endMinute     = ndb.IntegerProperty()
+    startHour     = ndb.IntegerProperty()
+    dayOfWeek     = ndb.IntegerProperty()
+    # copy of seatsAvailable > 0 of the conference, see SESSION_SEATS_FLAG
+    conferenceHasSeats = ndb.BooleanProperty()
 
 class SessionForm(messages.Message):
     """ SessionForm -- Session outbound form message."""
@@ -205,7 +250,9 @@ class SessionForm(messages.Message):
 
 class SessionForms(messages.Message):
     """ SessionForms -- multiple Session outbound form message."""
-    items = messages.MessageField(SessionForm, 1, repeated=True)
+    items         = messages.MessageField(SessionForm, 1, repeated=True)
+    nextPageToken = messages.StringField(2)
+    queryPlan     = messages.StringField(3)
 
 
 class IntervalForm(messages.Message):
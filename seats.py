@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+
+"""
+seats.py -- Udacity conference server-side Python App Engine
+    sharded seat counters for conference registration
+
+$Id$
+
+created on 2026 oct 17
+
+The available seats of a conference are split over NUM_SHARDS SeatShard
+entities, each one in its own entity group, so that registrations update
+different shards instead of all contending on the Conference entity.
+Conference.seatsAvailable becomes an aggregate of the shards: a coalesced
+task copies their total back to the Conference entity, where queries and
+the announcement still read it.
+
+"""
+
+import random
+import time
+
+from google.appengine.api import taskqueue
+from google.appengine.ext import ndb
+
+from models import SeatShard
+from settings import SESSION_SEATS_FLAG
+
+import announcements
+import cache
+
+NUM_SHARDS = 10
+SYNC_DELAY = 10  # seconds between two writes of Conference.seatsAvailable
+
+
+def shardKeys(conferenceKey):
+    """ Return the keys of all the seat shards of a conference."""
+    return [ndb.Key(SeatShard, '%s-%d' % (conferenceKey.urlsafe(), index))
+            for index in range(NUM_SHARDS)]
+
+
+def createShards(conferenceKey, seats):
+    """ Return the shards (not yet put) holding seats for a new conference."""
+
+    shards = []
+    for index, shardKey in enumerate(shardKeys(conferenceKey)):
+        # spread the remainder over the first shards
+        shardSeats = seats // NUM_SHARDS + (1 if index < seats % NUM_SHARDS else 0)
+        shards.append(SeatShard(key=shardKey, seats=shardSeats))
+    return shards
+
+
+def _loadShards(conference):
+    """ Return the shards of a conference, creating them from
+        conference.seatsAvailable for conferences created before sharding."""
+
+    keys = shardKeys(conference.key)
+    shards = ndb.get_multi(keys)
+    if None not in shards:
+        return shards
+
+    @ndb.transactional(xg=True)
+    def _create():
+        shards = ndb.get_multi(keys)
+        if None in shards:
+            shards = createShards(conference.key, conference.seatsAvailable or 0)
+            ndb.put_multi(shards)
+        return shards
+
+    return _create()
+
+
+def availableShardKeys(conference):
+    """ Return the keys of the shards which still have seats, shuffled so
+        concurrent registrations spread over them."""
+
+    keys = [shard.key for shard in _loadShards(conference) if shard.seats > 0]
+    random.shuffle(keys)
+    return keys
+
+
+def anyShardKey(conference):
+    """ Return the key of a random shard, e.g. to give a seat back."""
+    _loadShards(conference)
+    return random.choice(shardKeys(conference.key))
+
+
+def seatsChanged(conferenceKey):
+    """ Record that seats were taken or given back in a shard of a
+        conference. Inside a transaction this is done on commit."""
+    ndb.get_context().call_on_commit(lambda: scheduleSync(conferenceKey))
+
+
+def scheduleSync(conferenceKey):
+    """ Enqueue the copy of the total into Conference.seatsAvailable, at most
+        one task per conference every SYNC_DELAY seconds."""
+
+    window = int(time.time() // SYNC_DELAY)
+    try:
+        taskqueue.add(
+            name='seats-%s-%d' % (conferenceKey.urlsafe(), window),
+            params={'conference_websafeKey': conferenceKey.urlsafe()},
+            url='/tasks/sync_seats_available',
+            countdown=SYNC_DELAY
+        )
+    except (taskqueue.TaskAlreadyExistsError, taskqueue.TombstonedTaskError):
+        # a sync for this window is already pending
+        pass
+
+
+def syncSeatsAvailable(conferenceKey):
+    """ Copy the total of the shards into Conference.seatsAvailable."""
+
+    total = sum(shard.seats for shard in ndb.get_multi(shardKeys(conferenceKey))
+                if shard)
+
+    @ndb.transactional(xg=True)
+    def _sync():
+        conference = conferenceKey.get()
+        if conference and conference.seatsAvailable != total:
+            hadSeats = (conference.seatsAvailable or 0) > 0
+            wasAnnounced = announcements.nearlySoldOut(conference)
+            conference.seatsAvailable = total
+            conference.put()
+            cache.invalidate(conferenceKey)
+
+            if wasAnnounced != announcements.nearlySoldOut(conference):
+                announcements.conferenceChanged(conference)
+
+            # the sessions only keep whether there are seats left
+            if SESSION_SEATS_FLAG and hadSeats != (total > 0):
+                taskqueue.add(
+                    params={'conference_websafeKey': conferenceKey.urlsafe()},
+                    url='/tasks/update_session_seats_flag',
+                    transactional=True
+                )
+
+    _sync()
+    return total
+
+
+def addSeats(conference, delta):
+    """ Add delta seats to the shards of conference, or take them away when
+        delta is negative (never below zero). The shards of a conference
+        created before sharding are created first. Joins the transaction of
+        the caller if there is one."""
+
+    conferenceKey = conference.key
+
+    @ndb.transactional(xg=True)
+    def _add():
+        shards = _loadShards(conference)
+        if delta > 0:
+            shards[0].seats += delta
+            changed = delta
+        else:
+            changed = 0
+            for shard in shards:
+                taken = min(shard.seats, changed - delta)
+                shard.seats -= taken
+                changed -= taken
+        ndb.put_multi(shards)
+        if changed:
+            seatsChanged(conferenceKey)
+        return changed
+
+    return _add()
@@ -12,3 +12,21 @@ created/forked from conference.py by wesc on 2014 may 24
 
 # Replace the following lines with client IDs obtained from the APIs Console or Cloud Console.
 WEB_CLIENT_ID = '893782036254-7pg14kc2vros02g097984drh317t0evf.apps.googleusercontent.com'
+
+# Seconds a queryConferences/querySessions result stays in memcache, writes
+# invalidate it sooner. 0 disables the query result cache.
+QUERY_CACHE_TIME = 60
+
+# Keep Session.conferenceHasSeats up to date so additionalQuery2 runs as a
+# single indexed query. Run /tasks/migrate/session_seats_flag after turning
+# it on, so existing sessions get the flag.
+SESSION_SEATS_FLAG = False
+
+# Narrow a post-filtered startTime range of querySessions with an IN filter
+# on Session.startHour. Every filter set then needs an index starting with
+# startHour, declare those of your clients in index.yaml before turning it on.
+SESSION_TIME_BUCKET_FILTERS = False
+
+# Backend of the confirmation emails (see mailer.py): 'appengine' sends them
+# with the mail API, 'stub' only logs them and keeps them in memory.
+MAIL_BACKEND = 'appengine'
@@ -293,6 +293,12 @@ conferenceApp.controllers.controller('ShowConferenceCtrl', function ($scope, $lo
      */
     $scope.conferences = [];
 
+    /**
+     * Holds the token of the next page of the 'ALL' tab, null when there is no more page.
+     * @type {string}
+     */
+    $scope.nextPageToken = null;
+
     /**
      * Holds the state if offcanvas is enabled.
      *
@@ -414,6 +420,7 @@ conferenceApp.controllers.controller('ShowConferenceCtrl', function ($scope, $lo
      */
     $scope.queryConferences = function () {
         $scope.submitted = false;
+        $scope.nextPageToken = null;
         if ($scope.selectedTab == 'ALL') {
             $scope.queryConferencesAll();
         } else if ($scope.selectedTab == 'YOU_HAVE_CREATED') {
@@ -424,21 +431,31 @@ conferenceApp.controllers.controller('ShowConferenceCtrl', function ($scope, $lo
     };
 
     /**
-     * Invokes the conference.queryConferences API.
+     * Invokes the conference.queryConferences API. With a pageToken the page is added
+     * to the conferences already displayed.
+     *
+     * @param pageToken the nextPageToken of the previous page, if any.
      */
-    $scope.queryConferencesAll = function () {
-        var sendFilters = {
-            filters: []
-        }
-        for (var i = 0; i < $scope.filters.length; i++) {
-            var filter = $scope.filters[i];
-            if (filter.field && filter.operator && filter.value) {
-                sendFilters.filters.push({
-                    field: filter.field.enumValue,
-                    operator: filter.operator.enumValue,
-                    value: filter.value
-                });
+    $scope.queryConferencesAll = function (pageToken) {
+        var sendFilters;
+        if (pageToken) {
+            // the next page of the previous query, whatever the filters edited since
+            sendFilters = angular.extend({}, $scope.pageFilters, {pageToken: pageToken});
+        } else {
+            sendFilters = {
+                filters: []
             }
+            for (var i = 0; i < $scope.filters.length; i++) {
+                var filter = $scope.filters[i];
+                if (filter.field && filter.operator && filter.value) {
+                    sendFilters.filters.push({
+                        field: filter.field.enumValue,
+                        operator: filter.operator.enumValue,
+                        value: filter.value
+                    });
+                }
+            }
+            $scope.pageFilters = sendFilters;
         }
         $scope.loading = true;
         gapi.client.conference.queryConferences(sendFilters).
@@ -458,10 +475,13 @@ conferenceApp.controllers.controller('ShowConferenceCtrl', function ($scope, $lo
                         $scope.alertStatus = 'success';
                         $log.info($scope.messages);
 
-                        $scope.conferences = [];
+                        if (!pageToken) {
+                            $scope.conferences = [];
+                        }
                         angular.forEach(resp.items, function (conference) {
                             $scope.conferences.push(conference);
                         });
+                        $scope.nextPageToken = resp.nextPageToken || null;
                     }
                     $scope.submitted = true;
                 });
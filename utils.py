@@ -1,15 +1,81 @@
+import hashlib
 import json
+import logging
 import os
+import threading
 import time
 import uuid
 import endpoints
+from collections import OrderedDict
 from datetime import datetime
 
 from google.appengine.ext import ndb
+from google.appengine.api import apiproxy_stub_map
+from google.appengine.api import memcache
 from google.appengine.api import urlfetch
 
 from models import Profile
 
+MEMCACHE_TOKEN_KEY = "TOKEN:%s"
+TOKEN_CACHE_SIZE = 1000
+
+# token hash -> (user_id, expiry time), least recently used first
+_tokenCache = OrderedDict()
+_tokenCacheLock = threading.Lock()
+
+_requestState = threading.local()
+
+
+class RequestContext(object):
+    """ RequestContext -- state of the current request. The user, userId and
+        profile are resolved once and shared by the helpers, and the datastore
+        RPCs issued by the request are counted in rpcCount."""
+
+    def __init__(self, requestId):
+        self.requestId = requestId
+        self.user = None
+        self.userId = None
+        self.profile = None
+        self.rpcCount = 0
+
+
+def startRequest():
+    """ Start a new context for the current request and return it."""
+
+    _requestState.context = RequestContext(os.getenv('REQUEST_LOG_ID'))
+    return _requestState.context
+
+
+def requestContext():
+    """ Return the context of the current request, a thread may serve many
+        requests so a context left by a previous one is replaced."""
+
+    context = getattr(_requestState, 'context', None)
+    if context is None or context.requestId != os.getenv('REQUEST_LOG_ID'):
+        context = startRequest()
+    return context
+
+
+def _countDatastoreRpc(service, call, request, response):
+    requestContext().rpcCount += 1
+
+apiproxy_stub_map.apiproxy.GetPreCallHooks().Append(
+    'request_rpc_count', _countDatastoreRpc, 'datastore_v3')
+
+
+def logRpcCount(app):
+    """ Wrap the WSGI app so the datastore RPCs of each request it serves are
+        logged when the request ends."""
+
+    def _app(environ, start_response):
+        startRequest()
+        try:
+            return app(environ, start_response)
+        finally:
+            logging.info('%s %s: %d datastore RPCs', environ.get('REQUEST_METHOD'),
+                         environ.get('PATH_INFO'), requestContext().rpcCount)
+    return _app
+
 
 def getUserId(user, id_type="email"):
 
@@ -20,25 +86,17 @@ def getUserId(user, id_type="email"):
         """A workaround implementation for getting userid."""
         auth = os.getenv('HTTP_AUTHORIZATION')
         bearer, token = auth.split()
-        token_type = 'id_token'
-        if 'OAUTH_USER_ID' in os.environ:
-            token_type = 'access_token'
-        url = ('https://www.googleapis.com/oauth2/v1/tokeninfo?%s=%s'
-               % (token_type, token))
-        user = {}
-        wait = 1
-        for i in range(3):
-            resp = urlfetch.fetch(url)
-            if resp.status_code == 200:
-                user = json.loads(resp.content)
-                break
-            elif resp.status_code == 400 and 'invalid_token' in resp.content:
-                url = ('https://www.googleapis.com/oauth2/v1/tokeninfo?%s=%s'
-                       % ('access_token', token))
-            else:
-                time.sleep(wait)
-                wait = wait + i
-        return user.get('user_id', '')
+
+        # the token is only sent to the tokeninfo endpoint once per lifetime
+        tokenHash = hashlib.sha256(token).hexdigest()
+        userId = _getCachedUserId(tokenHash)
+        if userId is None:
+            user = _getTokenInfo(token)
+            userId = user.get('user_id', '')
+            expiresIn = int(user.get('expires_in', 0))
+            if userId and expiresIn > 0:
+                _cacheUserId(tokenHash, userId, expiresIn)
+        return userId
 
     if id_type == "custom":
         # implement your own user_id creation and getting algorythm
@@ -51,20 +109,76 @@ def getUserId(user, id_type="email"):
             return str(uuid.uuid1().get_hex())
 
 
+def _getTokenInfo(token):
+    """ Return the tokeninfo of an OAuth token, empty if it can't be verified."""
+
+    token_type = 'id_token'
+    if 'OAUTH_USER_ID' in os.environ:
+        token_type = 'access_token'
+    url = ('https://www.googleapis.com/oauth2/v1/tokeninfo?%s=%s'
+           % (token_type, token))
+    user = {}
+    wait = 1
+    for i in range(3):
+        resp = urlfetch.fetch(url)
+        if resp.status_code == 200:
+            user = json.loads(resp.content)
+            break
+        elif resp.status_code == 400 and 'invalid_token' in resp.content:
+            url = ('https://www.googleapis.com/oauth2/v1/tokeninfo?%s=%s'
+                   % ('access_token', token))
+        else:
+            time.sleep(wait)
+            wait = wait + i
+    return user
+
+
+def _getCachedUserId(tokenHash):
+    """ Return the cached user_id of a token, first from this instance then
+        from memcache, or None if it is unknown or the token expired."""
+
+    now = time.time()
+    with _tokenCacheLock:
+        entry = _tokenCache.pop(tokenHash, None)
+        if entry and entry[1] > now:
+            _tokenCache[tokenHash] = entry  # now the most recently used
+            return entry[0]
+
+    entry = memcache.get(MEMCACHE_TOKEN_KEY % tokenHash)
+    if entry and entry[1] > now:
+        _cacheLocally(tokenHash, entry)
+        return entry[0]
+    return None
+
+
+def _cacheUserId(tokenHash, userId, expiresIn):
+    """ Cache the user_id of a token until the token expires."""
+
+    entry = (userId, time.time() + expiresIn)
+    _cacheLocally(tokenHash, entry)
+    memcache.set(MEMCACHE_TOKEN_KEY % tokenHash, entry, time=expiresIn)
+
+
+def _cacheLocally(tokenHash, entry):
+    """ Put entry in the instance cache, dropping the least recently used."""
+
+    with _tokenCacheLock:
+        _tokenCache.pop(tokenHash, None)
+        _tokenCache[tokenHash] = entry
+        while len(_tokenCache) > TOKEN_CACHE_SIZE:
+            _tokenCache.popitem(last=False)
+
+
 def currentUser():
     """ Check if user already login and his or her profile is saved, return
         some userful data."""
 
-    user = endpoints.get_current_user()
-    if not user:
-        raise endpoints.UnauthorizedException('Authorization required')
-
-    userId = getUserId(user)
+    user, userId = currentUserId()
     # make profile key
     profileKey = ndb.Key(Profile, userId)
 
     # get the user profile from datastore and display name
-    profile = profileKey.get()
+    profile = currentProfileAsync().get_result()
 
     if not profile:
         raise endpoints.UnauthorizedException('You must save your profile first')
@@ -74,6 +188,38 @@ def currentUser():
     return user, userId, userDisplayName, profileKey
 
 
+def currentUserId():
+    """ Return the current user and userId, resolved once per request."""
+
+    context = requestContext()
+    if context.user is None:
+        user = endpoints.get_current_user()
+        if not user:
+            raise endpoints.UnauthorizedException('Authorization required')
+        context.userId = getUserId(user)
+        context.user = user
+    return context.user, context.userId
+
+
+@ndb.tasklet
+def currentProfileAsync():
+    """ Return the Profile of the current user (None if not saved yet), read
+        once per request. Inside a transaction it is always read again from
+        datastore and not kept, since the transaction may be retried."""
+
+    context = requestContext()
+    user, userId = currentUserId()
+
+    if ndb.in_transaction():
+        context.profile = None
+        profile = yield ndb.Key(Profile, userId).get_async()
+        raise ndb.Return(profile)
+
+    if context.profile is None:
+        context.profile = yield ndb.Key(Profile, userId).get_async()
+    raise ndb.Return(context.profile)
+
+
 def duration(startTime, endTime):
     """ Calculate and convert duration into readable format."""
 